@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 import environ
@@ -91,6 +92,16 @@ DATABASES = {
     "default": env.db("DATABASE_URL", default="sqlite:////"),
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The `poll_sources` process invalidates cached stats through this cache, so it must be
+# shared between processes: the default file cache is, for processes on the same host.
+# Use e.g. redis:// (which needs redis-py) when they run on several hosts.
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default=f"filecache://{Path(tempfile.gettempdir()) / 'work-pulse-cache'}"),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -140,3 +151,86 @@ if not DEBUG:
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Scrapers
+
+# Overall time budget, in seconds, for fetching all the sources of a refresh.
+# Sources that haven't answered by then are skipped until the next refresh.
+SCRAPERS_DEADLINE = env.float("SCRAPERS_DEADLINE", default=20)
+
+# Maximum number of listing pages read per source and refresh, and number of them
+# fetched concurrently. Crawling a source stops at the first page reaching projects
+# that are already stored.
+SCRAPERS_MAX_PAGES = env.int("SCRAPERS_MAX_PAGES", default=5)
+SCRAPERS_PAGES_PER_BATCH = env.int("SCRAPERS_PAGES_PER_BATCH", default=2)
+
+# Number of stored project URLs remembered in memory, to skip already stored
+# projects without querying the database.
+KNOWN_URLS_MAX = env.int("KNOWN_URLS_MAX", default=10_000)
+
+# How scraped projects that are already stored are handled: "upsert" updates the
+# ones whose title, description or publication date changed on their source,
+# "insert" keeps the version first saved.
+SCRAPERS_INGEST_MODE = env.str("SCRAPERS_INGEST_MODE", default="upsert")
+
+# Number of scraped projects of a source checked and saved at a time.
+SCRAPERS_BATCH_SIZE = env.int("SCRAPERS_BATCH_SIZE", default=100)
+
+# Minimum number of seconds between the end of a refresh of the sources and the
+# start of the next one, whether it's run by the poller or the home page.
+SCRAPERS_REFRESH_MIN_INTERVAL = env.float("SCRAPERS_REFRESH_MIN_INTERVAL", default=30)
+
+# Whether visiting the home page refreshes the sources in the background, for
+# deployments without the `poll_sources` poller.
+SCRAPERS_REFRESH_ON_VISIT = env.bool("SCRAPERS_REFRESH_ON_VISIT", default=False)
+
+# Seconds between two polls of the `poll_sources` command. Each poll only fetches
+# the sources that are due, see below.
+POLL_INTERVAL = env.float("POLL_INTERVAL", default=60)
+
+# Bounds, in seconds, of the interval between two polls of a source. Within them, a
+# source is polled again once SCRAPERS_PROJECTS_PER_POLL new projects are expected
+# on it, going by the rate it has been posting at.
+SCRAPERS_SOURCE_MIN_INTERVAL = env.float("SCRAPERS_SOURCE_MIN_INTERVAL", default=2 * 60)
+SCRAPERS_SOURCE_MAX_INTERVAL = env.float("SCRAPERS_SOURCE_MAX_INTERVAL", default=6 * 60 * 60)
+SCRAPERS_PROJECTS_PER_POLL = env.float("SCRAPERS_PROJECTS_PER_POLL", default=5)
+
+# Seconds a rendered stats page is kept in the cache. New projects invalidate it earlier.
+STATS_CACHE_TTL = env.int("STATS_CACHE_TTL", default=60 * 60)
+
+# BeautifulSoup parser of the HTML sources. Defaults to lxml when it's installed
+# (it's faster), html.parser otherwise.
+SCRAPERS_HTML_PARSER = env.str("SCRAPERS_HTML_PARSER", default="")
+
+# Number of hosts the scrapers keep a connection pool for, and number of
+# keep-alive connections kept per host.
+FETCH_POOL_CONNECTIONS = env.int("FETCH_POOL_CONNECTIONS", default=10)
+FETCH_POOL_MAXSIZE = env.int("FETCH_POOL_MAXSIZE", default=4)
+
+# Maximum size, in bytes, of a response body of a source without its own "max_bytes".
+# Larger responses are dropped, and their listing skipped.
+FETCH_MAX_BYTES = env.int("FETCH_MAX_BYTES", default=5 * 1024 * 1024)
+
+# Logging
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "verbose": {
+            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        },
+    },
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+            "formatter": "verbose",
+        },
+    },
+    "loggers": {
+        "core": {
+            "handlers": ["console"],
+            "level": env.str("CORE_LOG_LEVEL", default="INFO"),
+        },
+    },
+}
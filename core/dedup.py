@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+class KnownUrlIndex:
+    """
+    Bounded map of the URLs of the projects known to be stored to their content hash.
+
+    Holds the `maxsize` most recently seen URLs, which covers what the listings show from
+    one poll to the next. A URL missing from the index may still be stored, the database
+    is the reference for those.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._hashes: OrderedDict[str, str] = OrderedDict()
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def unknown(self, hashes: Mapping[str, str]) -> list[str]:
+        """
+        The URLs of `hashes` missing from the index or known with another content hash, in
+        their order. The unchanged ones are kept as the most recent, since they're still listed.
+        """
+        missing = []
+        with self._lock:
+            for url, content_hash in hashes.items():
+                if self._hashes.get(url) == content_hash:
+                    self._hashes.move_to_end(url)
+                else:
+                    missing.append(url)
+        return missing
+
+    def add(self, hashes: Mapping[str, str]):
+        with self._lock:
+            for url, content_hash in hashes.items():
+                self._hashes[url] = content_hash
+                self._hashes.move_to_end(url)
+            while len(self._hashes) > self.maxsize:
+                self._hashes.popitem(last=False)
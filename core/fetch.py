@@ -0,0 +1,512 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+import requests
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Responses telling to slow down, and the seconds a host is left alone after one without
+# Retry-After, and at most with one
+THROTTLING_STATUSES = {requests.codes.too_many_requests, requests.codes.service_unavailable}
+DEFAULT_RETRY_AFTER = 60
+MAX_RETRY_AFTER = 60 * 60
+
+# Bytes of a response body read at a time
+CHUNK_SIZE = 64 * 1024
+
+# Responses worth another attempt, on top of connection errors and timeouts
+RETRYABLE_STATUSES = {
+    requests.codes.internal_server_error,
+    requests.codes.bad_gateway,
+    requests.codes.service_unavailable,
+    requests.codes.gateway_timeout,
+}
+
+# time.monotonic() past which failed requests aren't attempted again, e.g. the end of a poll
+retry_deadline: ContextVar[float | None] = ContextVar("retry_deadline", default=None)
+
+
+class RateLimitedError(requests.RequestException):
+    """A request would have waited longer than allowed, given in seconds, for its host's rate limit."""
+
+
+class ResponseTooLargeError(requests.RequestException):
+    """A response body was larger than allowed for its host, given in bytes."""
+
+
+class _HedgeDroppedError(Exception):
+    """A hedged attempt wasn't sent, the first one having answered or the host being busy."""
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, in bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> float:
+        """
+        Takes a token and returns the number of seconds to wait before using it.
+
+        Raises:
+            RateLimitedError: when that would be more than `max_wait` seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens go negative while requests are queued for the next ones.
+            wait = max(self._paused_until - now, -(self._tokens - 1) / self.rate, 0)
+            if wait > max_wait:
+                raise RateLimitedError(round(wait, 1))
+            self._tokens -= 1
+            return wait
+
+    def pause(self, seconds: float):
+        """Holds back all requests for `seconds`, e.g. as asked by a Retry-After header."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class HostLimiter:
+    """Rate limit and maximum number of requests in flight to a host."""
+
+    def __init__(self, requests_per_second: float, burst: int = 1, max_in_flight: int = 1):
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    @contextmanager
+    def slot(self, max_wait: float) -> Iterator[None]:
+        """
+        Waits until a request can be sent, for `max_wait` seconds at most.
+
+        Raises:
+            RateLimitedError: when it would take longer
+        """
+        time.sleep(self.bucket.reserve(max_wait))
+        if not self._in_flight.acquire(timeout=max_wait):
+            raise RateLimitedError(max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def try_acquire(self) -> bool:
+        """Takes a slot if one is free right away, to be given back with `release()`."""
+        if not self._in_flight.acquire(blocking=False):
+            return False
+        try:
+            self.bucket.reserve(max_wait=0)
+        except RateLimitedError:
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        self._in_flight.release()
+
+
+class RetryPolicy(NamedTuple):
+    """How requests to a host are timed out, retried and hedged."""
+
+    # Seconds to wait for a connection, and for the server to send each part of its response
+    connect_timeout: float = 5
+    read_timeout: float = 10
+    # Attempts after the first one, on connection errors, timeouts and RETRYABLE_STATUSES
+    retries: int = 2
+    # Base and maximum of the exponentially growing delay between two attempts
+    backoff: float = 0.5
+    max_backoff: float = 5
+    # Percentile of the latencies of the host after which a second, hedged attempt is sent
+    # alongside a pending one, the first answer winning. None to never hedge.
+    hedge_percentile: float | None = None
+
+    def backoff_delay(self, retry: int) -> float:
+        # Anywhere up to the exponential delay ("full jitter"), so the retries of requests
+        # that failed together are spread out.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**retry))  # noqa: S311
+
+
+class LatencyWindow:
+    """Latencies, in seconds, of the last `size` responses of a host."""
+
+    # Fewer samples don't tell much about the latencies of a host
+    MIN_SAMPLES = 10
+
+    def __init__(self, size: int = 100):
+        self._latencies: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        """The `percent`th percentile of the latencies, None until there are MIN_SAMPLES of them."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < self.MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+
+def retry_after(response: requests.Response) -> float | None:
+    """Seconds to wait as given by the Retry-After header of a response, either seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - timezone.now()).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+def _answered(future: Future) -> bool:
+    return future.done() and not future.cancelled() and future.exception() is None
+
+
+class FetchClient:
+    """
+    HTTP client shared by the scrapers.
+
+    Every thread sends its requests through the same connection-pooling adapter, so
+    connections to a host are kept alive and reused across fetches and polls. Each
+    thread gets its own `requests.Session` on top of it since sessions aren't
+    thread-safe, while the urllib3 pools underneath are.
+
+    Hosts given a limit with `limit()` are sent requests at its rate and concurrency,
+    and left alone for a while when they answer 429 Too Many Requests, or 503 with a
+    Retry-After. Hosts given a RetryPolicy with `set_retry_policy()` have failed requests
+    retried, and slow ones hedged.
+
+    Response bodies are streamed, and dropped as soon as they grow past the maximum
+    size of their host, `max_bytes` unless set with `set_max_bytes()`.
+    """
+
+    def __init__(
+        self,
+        *,
+        headers: dict[str, str] | None = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        timeout: float = 15,
+        max_bytes: int = 5 * 1024 * 1024,
+    ):
+        """
+        Args:
+            headers: Default headers sent with every request
+            pool_connections: Number of hosts to keep a connection pool for
+            pool_maxsize: Number of idle connections kept alive per host
+            timeout: Default request timeout in seconds, for hosts without a RetryPolicy
+            max_bytes: Default maximum size of a response body, once decompressed
+        """
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._local = threading.local()
+        self._limiters: dict[str, HostLimiter] = {}
+        self._policies: dict[str, RetryPolicy] = {}
+        self._max_bytes: dict[str, int] = {}
+        self._bytes_received: dict[str, int] = defaultdict(int)
+        self._latencies: dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._counts: dict[str, dict[str, int]] = defaultdict(lambda: {"retries": 0, "hedges": 0, "hedges_won": 0})
+        self._lock = threading.Lock()
+        self._hedging_executor = ThreadPoolExecutor(thread_name_prefix="fetch")
+
+    def limit(self, host: str, *, requests_per_second: float, burst: int = 1, max_in_flight: int = 1):
+        self._limiters[host] = HostLimiter(requests_per_second, burst, max_in_flight)
+
+    def set_retry_policy(self, host: str, policy: RetryPolicy):
+        self._policies[host] = policy
+
+    def set_max_bytes(self, host: str, max_bytes: int):
+        self._max_bytes[host] = max_bytes
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request, attempting it again as the RetryPolicy of the host allows.
+
+        Returns the response of the last attempt when every attempt failed with a
+        RETRYABLE_STATUSES response. No attempt is started past the `retry_deadline`
+        of the current context.
+
+        Raises:
+            RateLimitedError: when the host's limit would hold the request back longer than the client timeout
+            ResponseTooLargeError: when the response body is larger than the maximum size of the host
+            requests.RequestException: when the last attempt failed
+        """
+        host = urlparse(url).hostname
+        policy = self._policies.get(host)
+        if policy is None:
+            kwargs.setdefault("timeout", self.timeout)
+            return self._send(host, method, url, **kwargs)
+
+        kwargs.setdefault("timeout", (policy.connect_timeout, policy.read_timeout))
+        deadline = retry_deadline.get()
+        retry = 0
+        while True:
+            try:
+                response, error = self._hedged_send(host, policy, method, url, **kwargs), None
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                response, error = None, exc
+            if error is None and response.status_code not in RETRYABLE_STATUSES:
+                return response
+            delay = policy.backoff_delay(retry)
+            if retry == policy.retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                if error is not None:
+                    raise error
+                return response
+            logger.debug("Attempt %d of %s failed: %s", retry + 1, url, error or response.status_code)
+            self._count(host, "retries")
+            time.sleep(delay)
+            retry += 1
+
+    def _hedged_send(self, host: str, policy: RetryPolicy, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request, and a second one when the first takes longer than the hedging
+        percentile of the latencies of the host and a slot to it is free right away. The first
+        response wins, the other is dropped.
+        """
+        delay = policy.hedge_percentile and self._latencies[host].percentile(policy.hedge_percentile)
+        if not delay:
+            return self._send(host, method, url, **kwargs)
+
+        first = self._hedging_executor.submit(self._send, host, method, url, **kwargs)
+        attempts = [first]
+        if not wait(attempts, timeout=delay).done:
+            hedge = self._hedging_executor.submit(self._send_hedge, host, first, method, url, **kwargs)
+            attempts.append(hedge)
+            pending = set(attempts)
+            while pending and not any(_answered(attempt) for attempt in attempts):
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Drops the hedged attempt if it's still waiting for a thread.
+            hedge.cancel()
+        # The first attempt, unless only the hedged one answered. Raises its error when both failed.
+        winner = next((attempt for attempt in attempts if _answered(attempt)), attempts[0])
+        if winner is not attempts[0]:
+            self._count(host, "hedges_won")
+        return winner.result()
+
+    def _send_hedge(self, host: str, first: Future, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Raises:
+            _HedgeDroppedError: when the first attempt answered meanwhile, or the host has no slot free right away
+        """
+        limiter = self._limiters.get(host)
+        if _answered(first) or (limiter is not None and not limiter.try_acquire()):
+            raise _HedgeDroppedError
+        self._count(host, "hedges")
+        return self._send(host, method, url, slot_taken=limiter is not None, **kwargs)
+
+    def _send(self, host: str, method: str, url: str, *, slot_taken: bool = False, **kwargs) -> requests.Response:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            return self._timed_send(host, method, url, **kwargs)
+
+        if slot_taken:
+            try:
+                response = self._timed_send(host, method, url, **kwargs)
+            finally:
+                limiter.release()
+        else:
+            with limiter.slot(max_wait=self.timeout):
+                response = self._timed_send(host, method, url, **kwargs)
+        if response.status_code not in THROTTLING_STATUSES:
+            return response
+        pause = retry_after(response)
+        if pause is None and response.status_code == requests.codes.too_many_requests:
+            pause = DEFAULT_RETRY_AFTER
+        if pause:
+            logger.warning("%s asked to slow down, pausing requests to it for %ss", host, round(pause))
+            limiter.bucket.pause(pause)
+        return response
+
+    def _timed_send(self, host: str, method: str, url: str, **kwargs) -> requests.Response:
+        started = time.perf_counter()
+        response = self.session.request(method, url, stream=True, **kwargs)
+        try:
+            # Stored where requests keeps a body it has read, for `content` and the rest to use it.
+            response._content = self._read_body(host, response)  # noqa: SLF001
+        finally:
+            # Gives the connection back to the pool, or drops it when the body wasn't read to the end.
+            response.close()
+        elapsed = time.perf_counter() - started
+        self._latencies[host].add(elapsed)
+        with self._lock:
+            self._bytes_received[host] += len(response.content)
+        logger.debug("Received %d bytes from %s in %.3fs", len(response.content), url, elapsed)
+        return response
+
+    def _read_body(self, host: str, response: requests.Response) -> bytes:
+        """
+        Raises:
+            ResponseTooLargeError: as soon as the body is known to be larger than the maximum size of the host
+        """
+        max_bytes = self._max_bytes.get(host, self.max_bytes)
+        length = response.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > max_bytes:
+            raise ResponseTooLargeError(max_bytes)
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ResponseTooLargeError(max_bytes)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _count(self, host: str, event: str):
+        with self._lock:
+            self._counts[host][event] += 1
+
+    def bytes_received(self) -> dict[str, int]:
+        """Bytes of response bodies received per host, once decompressed."""
+        with self._lock:
+            return dict(self._bytes_received)
+
+    def retry_stats(self) -> dict[str, dict[str, int]]:
+        """Retried attempts, hedged attempts and hedged attempts answering first per host."""
+        with self._lock:
+            return {host: dict(counts) for host, counts in self._counts.items()}
+
+    def connection_stats(self) -> dict[str, dict[str, int]]:
+        """
+        Requests sent, connections opened and connections reused per host.
+
+        Counts cover the pools currently alive; a pool evicted because more than
+        `pool_connections` hosts were contacted starts again from zero.
+        """
+        pools = self._adapter.poolmanager.pools
+        stats = {}
+        for key in pools.keys():  # noqa: SIM118 - the container can't be iterated directly
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[pool.host] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+        return stats
+
+
+class Validators(NamedTuple):
+    etag: str | None
+    last_modified: str | None
+    body_hash: str
+
+
+class ValidatorCache:
+    """
+    Remembers the validators and body hash of the last response saved per source.
+
+    Used to send conditional requests and to tell when a listing is exactly the same
+    as on the previous poll, so parsing and saving it can be skipped. A changed response
+    is only remembered once `commit()` tells its projects were saved, so a listing whose
+    poll failed midway is parsed again on the next one. Validators saved by other
+    processes are given back with `load()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._validators: dict[str, Validators] = {}
+        self._pending: dict[str, Validators] = {}
+        self._counts: dict[str, dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+
+    def conditional_headers(self, source: str) -> dict[str, str]:
+        validators = self._validators.get(source)
+        headers = {}
+        if validators and validators.etag:
+            headers["If-None-Match"] = validators.etag
+        if validators and validators.last_modified:
+            headers["If-Modified-Since"] = validators.last_modified
+        return headers
+
+    def is_unchanged(self, source: str, response: requests.Response) -> bool:
+        """
+        Tells whether the response of a source is the same as the last saved one, and holds
+        on to its validators until `commit()` when it isn't.
+        """
+        with self._lock:
+            previous = self._validators.get(source)
+            if response.status_code == requests.codes.not_modified:
+                unchanged = previous is not None
+            else:
+                body_hash = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+                unchanged = previous is not None and previous.body_hash == body_hash
+                if not unchanged:
+                    self._pending[source] = Validators(
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        body_hash=body_hash,
+                    )
+            self._counts[source]["hits" if unchanged else "misses"] += 1
+        return unchanged
+
+    def load(self, source: str, validators: Validators):
+        """Remembers the validators of a source saved by a previous process."""
+        with self._lock:
+            self._validators[source] = validators
+
+    def commit(self, source: str) -> Validators | None:
+        """
+        Remembers the last changed response of a source, once its projects are saved.
+
+        Returns:
+            Its validators, or None when the listing hadn't changed
+        """
+        with self._lock:
+            if source not in self._pending:
+                return None
+            self._validators[source] = self._pending.pop(source)
+            return self._validators[source]
+
+    def discard(self, source: str):
+        """Forgets the last changed response of a source, which couldn't be parsed."""
+        with self._lock:
+            self._pending.pop(source, None)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Number of unchanged (hits) and changed (misses) responses per source."""
+        with self._lock:
+            return {source: dict(counts) for source, counts in self._counts.items()}
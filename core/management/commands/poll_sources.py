@@ -0,0 +1,85 @@
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.scrapers import fetch_client
+from core.scrapers import validator_cache
+from core.services import refresh_projects
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Poll the enabled sources on a fixed interval and save new projects to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.POLL_INTERVAL,
+            help="Seconds between the start of two polls (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Poll once and exit, for running from cron.",
+        )
+
+    def handle(self, *args, interval, once, **options):
+        self.stopping = threading.Event()
+        if once:
+            self.poll()
+            return
+
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        logger.info("Polling sources every %ss", interval)
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self.poll()
+            # Keep a fixed rate: the time spent polling counts towards the interval.
+            self.stopping.wait(max(interval - (time.monotonic() - started), 0))
+        logger.info("Poller stopped")
+
+    def request_stop(self, signum, frame):
+        logger.info("Received %s, stopping after the current poll", signal.Signals(signum).name)
+        self.stopping.set()
+
+    def poll(self):
+        # Drop connections the database closed while we were sleeping.
+        close_old_connections()
+        try:
+            refresh_projects()
+        except Exception:
+            logger.exception("Error when polling sources")
+        self.log_connection_stats()
+        self.log_validator_stats()
+
+    def log_connection_stats(self):
+        for host, stats in sorted(fetch_client.connection_stats().items()):
+            logger.info(
+                "%s: %d requests over %d connections (%d reused)",
+                host,
+                stats["requests"],
+                stats["connections"],
+                stats["reused"],
+            )
+        for host, size in sorted(fetch_client.bytes_received().items()):
+            logger.info("%s: %d bytes received", host, size)
+        for host, stats in sorted(fetch_client.retry_stats().items()):
+            logger.info(
+                "%s: %d retried, %d hedged requests (%d answered first)",
+                host,
+                stats["retries"],
+                stats["hedges"],
+                stats["hedges_won"],
+            )
+
+    def log_validator_stats(self):
+        for source, stats in sorted(validator_cache.stats().items()):
+            logger.info("%s: %d unchanged, %d changed listings", source, stats["hits"], stats["misses"])
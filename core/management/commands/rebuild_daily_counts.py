@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.services import rebuild_daily_counts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily per-source project counts shown on the stats page from the projects table."
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily source counts"))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:31
+
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_source_and_published_day(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    last_pk = 0
+    while True:
+        batch = list(
+            Project.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'url', 'published_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for project in batch:
+            project.source = urlparse(project.url).netloc
+            project.published_day = timezone.localdate(project.published_at) if project.published_at else None
+        Project.objects.bulk_update(batch, ['source', 'published_day'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_project_viewed_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='published_day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='source',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RunPython(backfill_source_and_published_day, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['source', 'published_day'], name='project_source_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['published_day', 'source'], name='project_day_source_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['viewed', 'source'], name='project_viewed_source_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:33
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_project_source_published_day'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_viewed_source_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=core.models.NullsOrderIndex(models.OrderBy(models.F('published_at'), descending=True, nulls_last=True), condition=models.Q(('viewed__isnull', True)), name='project_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('viewed__isnull', False)), fields=['-viewed'], name='project_archived_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_daily_source_counts(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    DailySourceCount = apps.get_model('core', 'DailySourceCount')
+    counts = Project.objects.values_list('published_day', 'source').annotate(count=Count('id')).order_by()
+    DailySourceCount.objects.bulk_create(
+        (DailySourceCount(day=day, source=source, count=count) for day, source, count in counts),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_project_new_archived_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySourceCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('day', models.DateField(null=True)),
+                ('source', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'source'), name='daily_source_count_unique')],
+            },
+        ),
+        migrations.RunPython(fill_daily_source_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_dailysourcecount'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_archived_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(condition=models.Q(('viewed__isnull', False)), fields=['-viewed', '-id'], name='project_archived_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:38
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_project_archived_idx_id'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='project',
+            name='project_new_idx',
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=core.models.NullsOrderIndex(models.OrderBy(models.F('published_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('viewed__isnull', True)), name='project_new_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:47
+
+import hashlib
+from zoneinfo import ZoneInfo
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def content_hash(title, description, published_at):
+    # Frozen copy of core.models.content_hash()
+    published = published_at.astimezone(ZoneInfo('UTC')).isoformat() if published_at else ''
+    content = '\0'.join([title, description or '', published])
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    last_pk = 0
+    while True:
+        batch = list(
+            Project.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'title', 'description', 'published_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for project in batch:
+            project.content_hash = content_hash(project.title, project.description, project.published_at)
+        Project.objects.bulk_update(batch, ['content_hash'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_project_new_idx_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('source', models.CharField(max_length=100, unique=True)),
+                ('last_polled_at', models.DateTimeField(null=True)),
+                ('last_new_at', models.DateTimeField(null=True)),
+                ('rate', models.FloatField(null=True)),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('interval', models.DurationField(null=True)),
+                ('next_due_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
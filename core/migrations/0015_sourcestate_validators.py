@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sourcestate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcestate',
+            name='body_hash',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='sourcestate',
+            name='etag',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='sourcestate',
+            name='last_modified',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,6 +1,16 @@
+import hashlib
+from datetime import timedelta
 from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
 
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models import OrderBy
+from django.db.models import Q
+from django.utils import timezone
+
+from core.fetch import Validators
 
 
 class TimestampModel(models.Model):
@@ -16,19 +26,225 @@ class BaseModel(TimestampModel):
         abstract = True
 
 
+class NullsOrderIndex(models.Index):
+    """
+    Index whose expressions can set NULLS FIRST/LAST, e.g. to serve `ORDER BY ... DESC NULLS LAST` on PostgreSQL.
+
+    SQLite doesn't accept these modifiers in CREATE INDEX, but already sorts NULLs first in
+    ascending and last in descending order, so they're left out there when they match it.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor != "sqlite":
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        index = self.clone()
+        index.expressions = tuple(self._without_default_nulls_order(expression) for expression in self.expressions)
+        return super(NullsOrderIndex, index).create_sql(model, schema_editor, using=using, **kwargs)
+
+    @staticmethod
+    def _without_default_nulls_order(expression):
+        if isinstance(expression, OrderBy) and (
+            (expression.descending and expression.nulls_last) or (not expression.descending and expression.nulls_first)
+        ):
+            return OrderBy(expression.expression, descending=expression.descending)
+        return expression
+
+
+def content_hash(title: str, description: str | None, published_at) -> str:
+    """Hash of the scraped content of a project, telling when a source edited or republished it."""
+    published = published_at.astimezone(ZoneInfo("UTC")).isoformat() if published_at else ""
+    content = "\0".join([title, description or "", published])
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+class ProjectQuerySet(models.QuerySet):
+    def new(self):
+        """Unviewed projects, most recently published first."""
+        return self.filter(viewed__isnull=True).order_by(F("published_at").desc(nulls_last=True), "-id")
+
+    def archived(self):
+        """Viewed projects, most recently viewed first."""
+        return self.filter(viewed__isnull=False).order_by("-viewed", "-id")
+
+
 class Project(BaseModel):
     title = models.CharField(max_length=255)
     url = models.URLField(unique=True, max_length=1000)
     description = models.TextField(default="")
+    source = models.CharField(max_length=100, default="")
     viewed = models.DateTimeField(null=True)
     published_at = models.DateTimeField(null=True, blank=True)
+    published_day = models.DateField(null=True, blank=True)
+    content_hash = models.CharField(max_length=32, default="", editable=False)
+
+    objects = ProjectQuerySet.as_manager()
 
     class Meta:
         ordering = ["-viewed"]
+        indexes = [
+            models.Index(fields=["source", "published_day"], name="project_source_day_idx"),
+            models.Index(fields=["published_day", "source"], name="project_day_source_idx"),
+            # Access paths of ProjectQuerySet.new() and archived()
+            NullsOrderIndex(
+                F("published_at").desc(nulls_last=True),
+                F("id").desc(),
+                condition=Q(viewed__isnull=True),
+                name="project_new_idx",
+            ),
+            models.Index(fields=["-viewed", "-id"], condition=Q(viewed__isnull=False), name="project_archived_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        super().save(*args, **kwargs)
+
+    def set_derived_fields(self):
+        """
+        Fills the columns derived from url and the scraped content.
+
+        Called by save(), and by the ingest code before bulk_create() which doesn't call save().
+        """
+        self.source = urlparse(self.url).netloc
+        self.published_day = timezone.localdate(self.published_at) if self.published_at else None
+        self.content_hash = content_hash(self.title, self.description, self.published_at)
+
+
+class DailySourceCount(BaseModel):
+    """
+    Number of projects published per day and source, kept up to date at ingest for the stats page.
+
+    Projects without a published date are counted under a null day.
+    """
+
+    day = models.DateField(null=True)
+    source = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "source"], name="daily_source_count_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.day}: {self.count}"
+
+
+class LeaseQuerySet(models.QuerySet):
+    def available(self, min_interval: timedelta):
+        """Leases that aren't held, and were last released at least `min_interval` ago."""
+        now = timezone.now()
+        return self.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__lte=now),
+            Q(released_at__isnull=True) | Q(released_at__lte=now - min_interval),
+        )
+
+    def acquire(self, name: str, ttl: timedelta, min_interval: timedelta) -> bool:
+        """
+        Takes the lease named `name` for `ttl` at most, with a single conditional UPDATE
+        so that only one of several concurrent callers, in any process, gets it.
+        """
+        self.bulk_create([Lease(name=name)], ignore_conflicts=True)
+        now = timezone.now()
+        return bool(self.available(min_interval).filter(name=name).update(expires_at=now + ttl, updated=now))
+
+    def release(self, name: str):
+        now = timezone.now()
+        self.filter(name=name).update(expires_at=None, released_at=now, updated=now)
+
+
+class Lease(BaseModel):
+    """
+    Named lease held by at most one process at a time, e.g. while the sources are refreshed.
+
+    A lease whose holder died is available again once it expires.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    expires_at = models.DateTimeField(null=True)
+    released_at = models.DateTimeField(null=True)
+
+    objects = LeaseQuerySet.as_manager()
+
+    def __str__(self):
+        return self.name
+
+
+class SourceState(BaseModel):
+    """
+    Polling schedule of a source, adapted to how often it posts new projects.
+
+    A source is polled again once enough new projects are expected on it, going by the
+    smoothed rate observed so far, within the bounds of the SCRAPERS_SOURCE_*_INTERVAL
+    settings. A quiet source's interval grows at most twofold per poll, and failures
+    back off exponentially.
+
+    Also keeps the validators of the last saved listing of the source, for the polls of
+    every process to send conditional requests and skip unchanged listings.
+    """
+
+    # Weight of the latest observation in the smoothed posting rate
+    RATE_SMOOTHING = 0.3
+
+    source = models.CharField(max_length=100, unique=True)
+    last_polled_at = models.DateTimeField(null=True)
+    last_new_at = models.DateTimeField(null=True)
+    # New projects per hour
+    rate = models.FloatField(null=True)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    interval = models.DurationField(null=True)
+    next_due_at = models.DateTimeField(null=True)
+    etag = models.TextField(blank=True, default="")
+    last_modified = models.CharField(max_length=64, blank=True, default="")
+    body_hash = models.CharField(max_length=32, blank=True, default="")
+
+    def __str__(self):
+        return self.source
+
     @property
-    def source(self):
-        return urlparse(self.url).netloc
+    def validators(self) -> Validators | None:
+        if not self.body_hash:
+            return None
+        return Validators(etag=self.etag or None, last_modified=self.last_modified or None, body_hash=self.body_hash)
+
+    @validators.setter
+    def validators(self, validators: Validators):
+        self.etag = validators.etag or ""
+        self.last_modified = (validators.last_modified or "")[:64]
+        self.body_hash = validators.body_hash
+
+    def is_due(self, now) -> bool:
+        return self.next_due_at is None or self.next_due_at <= now
+
+    def record_poll(self, now, new_count: int):
+        if self.last_polled_at is not None:
+            hours = max((now - self.last_polled_at).total_seconds() / 3600, 1 / 60)
+            observed = new_count / hours
+            self.rate = (
+                observed
+                if self.rate is None
+                else self.RATE_SMOOTHING * observed + (1 - self.RATE_SMOOTHING) * self.rate
+            )
+        self.last_polled_at = now
+        if new_count:
+            self.last_new_at = now
+        self.consecutive_failures = 0
+
+        min_interval = timedelta(seconds=settings.SCRAPERS_SOURCE_MIN_INTERVAL)
+        max_interval = min(
+            timedelta(seconds=settings.SCRAPERS_SOURCE_MAX_INTERVAL),
+            2 * self.interval if self.interval else min_interval,
+        )
+        if self.rate:
+            interval = timedelta(hours=settings.SCRAPERS_PROJECTS_PER_POLL / self.rate)
+        else:
+            interval = max_interval if self.rate is not None else min_interval
+        self.interval = max(min(interval, max_interval), min_interval)
+        self.next_due_at = now + self.interval
+
+    def record_failure(self, now):
+        self.consecutive_failures += 1
+        backoff = timedelta(seconds=settings.SCRAPERS_SOURCE_MIN_INTERVAL) * 2**self.consecutive_failures
+        self.next_due_at = now + min(backoff, timedelta(seconds=settings.SCRAPERS_SOURCE_MAX_INTERVAL))
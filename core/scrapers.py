@@ -1,13 +1,32 @@
+import hashlib
+import json
 import logging
+import time
+from collections.abc import Iterator
 from datetime import datetime
+from functools import partial
 from typing import Any
+from typing import NamedTuple
+from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 
 import requests
+import soupsieve
 from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
+from django.conf import settings
 from django.utils import timezone
 from slugify import slugify
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from core.fetch import FetchClient
+from core.fetch import RetryPolicy
+from core.fetch import ValidatorCache
+
 REQUEST_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/108.0.0.0 Safari/537.36",
@@ -22,28 +41,85 @@ REQUEST_HEADERS = {
 
 SOURCES_CONFIG = {
     "mostaql.com": {
-        "url": "https://mostaql.com/projects?category=development,support&budget_max=10000&sort=latest",
+        "url": "https://mostaql.com/projects?category=development,support&budget_max=10000&sort=latest&page={page}",
         "parser": "html",
+        "encoding": "utf-8",
+        # (tag name, class) of the element holding the listing, the only part parsed
+        "container": (None, "projects-table"),
+        # Rows of the listing and the CSS selector of each ScrapedItem field in a row,
+        # either a selector whose text is taken or a (selector, attribute) pair.
+        "extract": {
+            "rows": ".projects-table tbody tr",
+            "fields": {
+                "title": ".card--title a",
+                "url": (".card--title a", "href"),
+                "description": ".project__brief a",
+                "published_at": ("time", "datetime"),
+            },
+            "date_format": "%Y-%m-%d %H:%M:%S",
+        },
+        # Requests per second to the host on average, requests sent at once at most,
+        # and requests in flight at most. Also lowered by the host with 429 responses.
+        "rate_limit": {"requests_per_second": 1, "burst": 2, "max_in_flight": 2},
+        # Overrides of the RetryPolicy defaults: timeouts, retries and backoff of failed
+        # requests, and the latency percentile past which a request is hedged.
+        "retry": {},
         "type": "project",
         "color": "#2CAAE2",
+        "enabled": True,
     },
     "nafezly.com": {
-        "url": "https://nafezly.com/projects?specialize=development&page=1",
+        "url": "https://nafezly.com/projects?specialize=development&page={page}",
         "parser": "html",
+        "encoding": "utf-8",
+        "container": (None, "project-box"),
+        "extract": {
+            "rows": ".project-box",
+            "fields": {
+                "title": "a.text-truncate",
+                "url": ("a.text-truncate", "href"),
+                "description": "h3",
+            },
+        },
+        "rate_limit": {"requests_per_second": 1, "burst": 2, "max_in_flight": 2},
+        "retry": {},
         "type": "project",
         "color": "#0290FE",
+        "enabled": False,
     },
     "emploitic.com": {
-        "url": "https://emploitic.com/api/v4/jobs?sort[0]=publishedAt_timestamp:desc&filter=(criteria.profession.id=%27a0d04378f37973ffa3b2aa8b3e27a3f0a98de06d%27)&pagination[page]=1&pagination[pageSize]=20",
+        "url": "https://emploitic.com/api/v4/jobs?sort[0]=publishedAt_timestamp:desc&filter=(criteria.profession.id=%27a0d04378f37973ffa3b2aa8b3e27a3f0a98de06d%27)&pagination[page]={page}&pagination[pageSize]=20",
         "parser": "json",
+        "rate_limit": {"requests_per_second": 2, "burst": 2, "max_in_flight": 2},
+        "retry": {"hedge_percentile": 95},
+        # Maximum size, in bytes, of a response, FETCH_MAX_BYTES by default
+        "max_bytes": 2 * 1024 * 1024,
         "type": "job",
         "color": "#02C97B",
+        "enabled": True,
     },
     "baaeed.com": {
-        "url": "https://baaeed.com/remote-jobs?sort=latest&categories=remote-programming-jobs,other-remote-jobs",
+        "url": "https://baaeed.com/remote-jobs?sort=latest&categories=remote-programming-jobs,other-remote-jobs&page={page}",
         "parser": "html",
+        "encoding": "utf-8",
+        "container": ("section", "baaeed-card"),
+        "extract": {
+            "rows": "section.baaeed-card table tr",
+            "fields": {
+                "title": ".baaeed-list__item--details h3.card-title a",
+                "url": (".baaeed-list__item--details h3.card-title a", "href"),
+                "description": ".card-brief a",
+                "published_at": ("time", "datetime"),
+            },
+            # Dates are written with Arabic month names
+            "arabic_date": True,
+            "date_format": "%Y-%m-%d %H:%M:%S",
+        },
+        "rate_limit": {"requests_per_second": 1, "burst": 2, "max_in_flight": 2},
+        "retry": {},
         "type": "job",
         "color": "#7566F0",
+        "enabled": True,
     },
     "bahr.sa": {
         "url": (
@@ -55,43 +131,219 @@ SOURCES_CONFIG = {
             "&projectCategories[]=0190c21f-f7cc-75f2-aef3-6d0209251c29"
             "&projectCategories[]=0190c21f-f7cc-75f2-aef3-6d020ca6b9c7"
             "&recruitmentStatus[]=Open"
-            "&page=1"
+            "&page={page}"
         ),
         "parser": "json",
+        "rate_limit": {"requests_per_second": 2, "burst": 2, "max_in_flight": 2},
+        "retry": {"hedge_percentile": 95},
         "type": "project",
         "color": "#1F5FB3",
+        "enabled": True,
     },
     "ouedkniss.com": {
         "url": "https://api.ouedkniss.com/graphql",
         "parser": "graphql",
+        "persisted_query": True,
+        # Number of offers requested per poll
+        "page_size": 24,
+        "rate_limit": {"requests_per_second": 2, "burst": 2, "max_in_flight": 2},
+        "retry": {"hedge_percentile": 95},
+        "max_bytes": 1024 * 1024,
         "type": "offer",
         "color": "#F3B605",
+        "enabled": False,
     },
 }
 
 logger = logging.getLogger(__name__)
 
 
+class FetchError(Exception):
+    """The listing of a source couldn't be fetched."""
+
+
+class ScrapedItem(NamedTuple):
+    """A project as scraped from a source, before it's turned into a Project."""
+
+    title: str
+    url: str
+    description: str | None = ""
+    # A datetime, or an ISO 8601 string as given by the API sources
+    published_at: datetime | str | None = None
+
+
+fetch_client = FetchClient(
+    headers=REQUEST_HEADERS,
+    pool_connections=settings.FETCH_POOL_CONNECTIONS,
+    pool_maxsize=settings.FETCH_POOL_MAXSIZE,
+    max_bytes=settings.FETCH_MAX_BYTES,
+)
+for _config in SOURCES_CONFIG.values():
+    _host = urlparse(_config["url"]).hostname
+    fetch_client.limit(_host, **_config["rate_limit"])
+    fetch_client.set_retry_policy(_host, RetryPolicy(**_config["retry"]))
+    if "max_bytes" in _config:
+        fetch_client.set_max_bytes(_host, _config["max_bytes"])
+validator_cache = ValidatorCache()
+_persisted_queries_unsupported: set[str] = set()
+
+# Only the fields of the offers that are used, see fetch_ouedkniss_offers().
+OUEDKNISS_SEARCH_QUERY = """
+query SearchQuery($filter: SearchFilterInput) {
+  search(filter: $filter) {
+    announcements {
+      data {
+        id
+        slug
+        title
+        description
+        createdAt: refreshedAt
+      }
+    }
+  }
+}
+"""
+
+
 # --- Helper Functions ---
 
 
-def _make_request(url: str, method: str = "GET", **kwargs) -> requests.Response | None:
-    """Makes an HTTP request with error handling."""
+def _make_request(url: str, method: str = "GET", *, check_status: bool = True, **kwargs) -> requests.Response | None:
+    """Makes an HTTP request with error handling, and unless `check_status` is False, of error statuses."""
     try:
-        response = requests.request(
-            method,
-            url,
-            headers=REQUEST_HEADERS,
-            timeout=15,
-            **kwargs,
-        )
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+        response = fetch_client.request(method, url, **kwargs)
+        if check_status:
+            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
     except requests.exceptions.RequestException:
         logger.exception("Request failed for '%s'", url)
     else:
         return response
 
 
+def _fetch_listing(source: str, method: str = "GET", page: int = 1, **kwargs) -> requests.Response | None:
+    """
+    Fetches a page of the listing of a source.
+
+    Returns None when the request of a follow-up page failed, or when the first page hasn't
+    changed since the previous poll (304 response or same body), so there is nothing new to parse.
+
+    Raises:
+        FetchError: when the request of the first page failed
+    """
+    url = SOURCES_CONFIG[source]["url"].format(page=page)
+    if page > 1:
+        return _make_request(url, method=method, **kwargs)
+
+    headers = validator_cache.conditional_headers(source) if method == "GET" else {}
+    response = _make_request(url, method=method, headers=headers, **kwargs)
+    if response is None:
+        raise FetchError(source)
+    return _unless_unchanged(source, response)
+
+
+def _unless_unchanged(source: str, response: requests.Response) -> requests.Response | None:
+    """The first page of the listing of a source, or None when it's the same as the last saved one."""
+    if validator_cache.is_unchanged(source, response):
+        logger.debug("%s listing unchanged since the previous poll", source)
+        return None
+    return response
+
+
+def _decode_json(source: str, response: requests.Response) -> Any:
+    """
+    Decodes a JSON listing from the raw bytes, with orjson when it's installed.
+    """
+    started = time.perf_counter()
+    data = orjson.loads(response.content) if orjson else json.loads(response.content)
+    logger.debug(
+        "Decoded %s listing (%d bytes) in %.3fs",
+        source,
+        len(response.content),
+        time.perf_counter() - started,
+    )
+    return data
+
+
+def _graphql_request(source: str, query: str, variables: dict[str, Any], page: int = 1) -> dict[str, Any] | None:
+    """
+    Posts a GraphQL query to a source and returns the decoded response.
+
+    Sources with "persisted_query" set are first sent the hash of the query only
+    (Apollo automatic persisted queries). The full query is sent whenever that probe
+    doesn't answer with data, e.g. when the server doesn't know the hash yet, which
+    registers it, or doesn't support them at all, in which case they are no longer
+    tried for this source. Only the response whose data is used goes through the
+    validator cache.
+    """
+    payload = {"variables": variables}
+    if SOURCES_CONFIG[source].get("persisted_query") and source not in _persisted_queries_unsupported:
+        payload["extensions"] = {
+            "persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(query.encode()).hexdigest()},
+        }
+        url = SOURCES_CONFIG[source]["url"].format(page=page)
+        response = _make_request(url, method="POST", check_status=False, json=payload)
+        data = _decode_probe(source, response) if response is not None else None
+        if data and data.get("data") and response.ok:
+            if page == 1 and _unless_unchanged(source, response) is None:
+                return None
+            return data
+        errors = {error.get("message") for error in (data or {}).get("errors") or []}
+        if "PersistedQueryNotSupported" in errors:
+            logger.info("%s doesn't support persisted queries", source)
+            _persisted_queries_unsupported.add(source)
+            del payload["extensions"]
+        else:
+            logger.debug("Sending the full query to %s, its persisted query answered: %s", source, errors)
+
+    response = _fetch_listing(source, method="POST", page=page, json={**payload, "query": query})
+    if response is None:
+        return None
+    return _decode_json(source, response)
+
+
+def _decode_probe(source: str, response: requests.Response) -> dict[str, Any] | None:
+    """The decoded answer to a persisted query, None when it isn't a JSON object, e.g. an HTML error page."""
+    try:
+        data = _decode_json(source, response)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _html_parser() -> str:
+    if settings.SCRAPERS_HTML_PARSER:
+        return settings.SCRAPERS_HTML_PARSER
+    try:
+        import lxml  # noqa: F401, PLC0415
+    except ImportError:
+        return "html.parser"
+    return "lxml"
+
+
+HTML_PARSER = _html_parser()
+
+
+def _parse_html(source: str, response: requests.Response) -> BeautifulSoup:
+    """
+    Parses the HTML listing of a source, building a tree of its container element only.
+
+    The raw bytes are decoded with the known encoding of the source, which avoids
+    detecting the charset of the whole page through `response.text`.
+    """
+    config = SOURCES_CONFIG[source]
+    name, class_name = config["container"]
+    started = time.perf_counter()
+    soup = BeautifulSoup(
+        response.content,
+        HTML_PARSER,
+        # The strainer sees the raw class attribute, not the list of classes.
+        parse_only=SoupStrainer(name, class_=lambda value: value is not None and class_name in value.split()),
+        from_encoding=config["encoding"],
+    )
+    logger.debug("Parsed %s listing with %s in %.3fs", source, HTML_PARSER, time.perf_counter() - started)
+    return soup
+
+
 def _parse_arabic_date(dt: str) -> str:
     arabic_months = {
         "يناير": 1,
@@ -131,98 +383,76 @@ def _parse_datetime(
         return dt
 
 
-def _safe_extract_text(element, selector: str, default: str = "") -> str:
-    """Safely extracts text from a BeautifulSoup element."""
-    try:
-        target = element.select_one(selector)
-        if target:
-            text = target.text
-            return text.strip()
-    except Exception:
-        logger.exception("Error extracting text with selector '%s'", selector)
-    return default
+class Extractor:
+    """
+    Extracts the items of an HTML listing following the "extract" spec of a source.
 
+    Selectors are compiled once, and each distinct selector is matched once per row
+    even when several fields read from the same element.
+    """
 
-def _safe_extract_attr(
-    element,
-    selector: str,
-    attr: str,
-    default: str | None = None,
-) -> str | None:
-    """Safely extracts an attribute from a BeautifulSoup element."""
-    try:
-        target = element.select_one(selector)
-        if target and target.has_attr(attr):
-            return target[attr]
-    except Exception:
-        logger.exception(
-            f"Error extracting attribute '{attr}' with selector '{selector}'",  # noqa: G004
-        )
+    def __init__(self, spec: dict[str, Any]):
+        self.rows = soupsieve.compile(spec["rows"])
+        self.fields = {
+            name: (field, None) if isinstance(field, str) else field for name, field in spec["fields"].items()
+        }
+        self.selectors = {selector: soupsieve.compile(selector) for selector, _ in self.fields.values()}
 
-    return default
+    def extract(self, soup: BeautifulSoup) -> Iterator[dict[str, str | None]]:
+        for row in self.rows.select(soup):
+            targets = {selector: compiled.select_one(row) for selector, compiled in self.selectors.items()}
+            item = {}
+            for name, (selector, attr) in self.fields.items():
+                target = targets[selector]
+                if attr is None:
+                    item[name] = target.text.strip() if target else ""
+                else:
+                    item[name] = target.get(attr) if target else None
+            yield item
 
 
-# --- Scraper Functions ---
+EXTRACTORS = {source: Extractor(config["extract"]) for source, config in SOURCES_CONFIG.items() if "extract" in config}
 
 
-def fetch_mostaql_projects() -> list[dict[str, Any]]:
-    config = SOURCES_CONFIG["mostaql.com"]
-    response = _make_request(config["url"])
-    if not response:
-        return []
+def _parse_published_at(spec: dict[str, Any], value: str | None) -> datetime | None:
+    if not value:
+        return None
+    if spec.get("arabic_date"):
+        value = _parse_arabic_date(value)
+    return _parse_datetime(value, spec["date_format"])
 
-    projects = []
-    try:
-        soup = BeautifulSoup(response.text, "html.parser")
-        for project_row in soup.select(".projects-table tbody tr"):
-            published_at_str = _safe_extract_attr(project_row, "time", "datetime")
-            projects.append(
-                {
-                    "title": _safe_extract_text(project_row, ".card--title a"),
-                    "url": _safe_extract_attr(project_row, ".card--title a", "href"),
-                    "description": _safe_extract_text(project_row, ".project__brief a"),
-                    "published_at": _parse_datetime(
-                        published_at_str,
-                        "%Y-%m-%d %H:%M:%S",
-                    ),
-                },
-            )
-    except Exception:
-        logger.exception("Error parsing Mostaql projects")
-    return [p for p in projects if p.get("url")]  # Ensure URL is present
+
+# --- Scraper Functions ---
 
 
-def fetch_nafezly_projects() -> list[dict[str, Any]]:
-    config = SOURCES_CONFIG["nafezly.com"]
-    response = _make_request(config["url"])
+def fetch_html_listing(source: str, page: int = 1) -> Iterator[ScrapedItem]:
+    """
+    Fetches a page of the listing of an HTML source, extracted according to its spec in SOURCES_CONFIG.
+    """
+    response = _fetch_listing(source, page=page)
     if not response:
-        return []
+        return
 
-    projects = []
+    spec = SOURCES_CONFIG[source]["extract"]
     try:
-        soup = BeautifulSoup(response.text, "html.parser")
-        projects.extend(
-            {
-                "title": _safe_extract_text(project_box, "a.text-truncate"),
-                "url": _safe_extract_attr(project_box, "a.text-truncate", "href"),
-                "description": _safe_extract_text(project_box, "h3"),
-            }
-            for project_box in soup.select(".project-box")
-        )
+        soup = _parse_html(source, response)
+        for item in EXTRACTORS[source].extract(soup):
+            if item.get("url"):
+                if "published_at" in item:
+                    item["published_at"] = _parse_published_at(spec, item["published_at"])
+                yield ScrapedItem(**item)
     except Exception:
-        logger.exception("Error parsing Nafezly projects")
-    return [p for p in projects if p.get("url")]
+        logger.exception("Error parsing %s listing", source)
+        validator_cache.discard(source)
 
 
-def fetch_emploitic_jobs() -> list[dict[str, Any]]:
-    config = SOURCES_CONFIG["emploitic.com"]
-    response = _make_request(config["url"])
+def fetch_emploitic_jobs(page: int = 1) -> Iterator[ScrapedItem]:
+    response = _fetch_listing("emploitic.com", page=page)
     if not response:
-        return []
+        return
 
-    jobs = []
     try:
-        data = response.json()
+        data = _decode_json("emploitic.com", response)
         base_url = "https://emploitic.com"
 
         def generate_job_url(job_alias, company_data):
@@ -232,318 +462,85 @@ def fetch_emploitic_jobs() -> list[dict[str, Any]]:
                 return f"{base_url}/entreprises/{company_alias}/offres-d-emploi/{sector_slug}/{job_alias}/"
             return f"{base_url}/offres-d-emploi/{sector_slug}/{job_alias}"
 
-        jobs.extend(
-            {
-                "title": job.get("title"),
-                "url": generate_job_url(job.get("alias"), job.get("company", {})),
-                "description": job.get(
-                    "description",
-                ),  # Assuming this is HTML description
-                "published_at": job.get("publishedAt"),
-            }
-            for job in data.get("results", [])
-        )
+        for job in data.get("results", []):
+            yield ScrapedItem(
+                title=job.get("title"),
+                url=generate_job_url(job.get("alias"), job.get("company", {})),
+                description=job.get("description"),  # Assuming this is HTML description
+                published_at=job.get("publishedAt"),
+            )
 
     except Exception:
         logger.exception("Error parsing Emploitic jobs")
-    return [j for j in jobs if j.get("url")]
+        validator_cache.discard("emploitic.com")
 
 
-def fetch_baaeed_jobs() -> list[dict[str, Any]]:
-    config = SOURCES_CONFIG["baaeed.com"]
-    response = _make_request(config["url"])
+def fetch_bahr_projects(page: int = 1) -> Iterator[ScrapedItem]:
+    response = _fetch_listing("bahr.sa", page=page)
     if not response:
-        return []
+        return
 
-    jobs = []
     try:
-        soup = BeautifulSoup(response.text, "html.parser")
-        for job_row in soup.select("section.baaeed-card table tr"):
-            published_at_str = _safe_extract_attr(job_row, "time", "datetime")
-            published_at_str = _parse_arabic_date(published_at_str)
-            jobs.append(
-                {
-                    "title": _safe_extract_text(
-                        job_row,
-                        ".baaeed-list__item--details h3.card-title a",
-                    ),
-                    "url": _safe_extract_attr(
-                        job_row,
-                        ".baaeed-list__item--details h3.card-title a",
-                        "href",
-                    ),
-                    "description": _safe_extract_text(job_row, ".card-brief a"),
-                    "published_at": _parse_datetime(
-                        published_at_str,
-                        "%Y-%m-%d %H:%M:%S",
-                    ),
-                },
-            )
-    except Exception:
-        logger.exception("Error parsing Baaeed jobs")
-    return [j for j in jobs if j.get("url")]
-
-
-def fetch_bahr_projects() -> list[dict[str, Any]]:
-    config = SOURCES_CONFIG["bahr.sa"]
-    response = _make_request(config["url"])
-    if not response:
-        return []
-
-    projects = []
-    try:
-        data = response.json().get("data", {}).get("recruitments", [])
-        projects.extend(
-            {
-                "title": project["project"]["title"],
-                "description": project["project"]["description"],
-                "url": f"https://bahr.sa/en/projects/recruitments/{project.get('id')}",
-                "published_at": _parse_datetime(
+        data = _decode_json("bahr.sa", response).get("data", {}).get("recruitments", [])
+        for project in data:
+            yield ScrapedItem(
+                title=project["project"]["title"],
+                description=project["project"]["description"],
+                url=f"https://bahr.sa/en/projects/recruitments/{project.get('id')}",
+                published_at=_parse_datetime(
                     project.get("createdAt"),
                     "%Y-%m-%d %H:%M:%S",
                 ),
-            }
-            for project in data
-        )
+            )
 
     except Exception:
         logger.exception("Error parsing Bahr projects")
-
-    return [p for p in projects if p.get("url")]
+        validator_cache.discard("bahr.sa")
 
 
-def fetch_ouedkniss_offers() -> list[dict[str, Any]]:
+def fetch_ouedkniss_offers(page: int = 1) -> Iterator[ScrapedItem]:
     config = SOURCES_CONFIG["ouedkniss.com"]
-    query = """
-        query SearchQuery($q: String, $filter: SearchFilterInput,
-                      $mediaSize: MediaSize = MEDIUM)
-                         {
-      search(q: $q, filter: $filter) {
-     announcements {
-          data {
-            ...AnnouncementContent
-            smallDescription {
-              valueText
-              __typename
-            }
-            noAdsense
-            __typename
-          }
-          paginatorInfo {
-            lastPage
-            hasMorePages
-            __typename
-          }
-          __typename
-        }
-        active {
-          category {
-            id
-            name
-            slug
-            icon
-            delivery
-            deliveryType
-            priceUnits
-            children {
-              id
-              name
-              slug
-              icon
-              __typename
-            }
-            specifications {
-              isRequired
-              specification {
-                id
-                codename
-                label
-                type
-                class
-                datasets {
-                  codename
-                  label
-                  __typename
-                }
-                dependsOn {
-                  id
-                  codename
-                  __typename
-                }
-                subSpecifications {
-                  id
-                  codename
-                  label
-                  type
-                  __typename
-                }
-                allSubSpecificationCodenames
-                __typename
-              }
-              __typename
-            }
-            parentTree {
-              id
-              name
-              slug
-              icon
-              children {
-                id
-                name
-                slug
-                icon
-                __typename
-              }
-              __typename
-            }
-            parent {
-              id
-              name
-              icon
-              slug
-              __typename
-            }
-            __typename
-          }
-          count
-          filter {
-            cities {
-              id
-              name
-              __typename
-            }
-            regions {
-              id
-              name
-              __typename
-            }
-            __typename
-          }
-          __typename
-        }
-        suggested {
-          category {
-            id
-            name
-            slug
-            icon
-            __typename
-          }
-          count
-          __typename
-        }
-        __typename
-      }
-    }
-
-    fragment AnnouncementContent on Announcement {
-      id
-      title
-      slug
-      createdAt: refreshedAt
-      isFromStore
-      isCommentEnabled
-      userReaction {
-        isBookmarked
-        isLiked
-        __typename
-      }
-      hasDelivery
-      deliveryType
-      paymentMethod
-      likeCount
-      description
-      status
-      cities {
-        id
-        name
-        slug
-        region {
-          id
-          name
-          slug
-          __typename
-        }
-        __typename
-      }
-      store {
-        id
-        name
-        slug
-        imageUrl
-        isOfficial
-        isVerified
-        __typename
-      }
-      user {
-        id
-        __typename
-      }
-      defaultMedia(size: $mediaSize) {
-        mediaUrl
-        mimeType
-        thumbnail
-        __typename
-      }
-      price
-      pricePreview
-      priceUnit
-      oldPrice
-      oldPricePreview
-      priceType
-      exchangeType
-      category {
-        id
-        slug
-        __typename
-      }
-      __typename
-    }
-        """
-
-    payload = {
-        "operationName": "SearchQuery",
-        "variables": {
-            "mediaSize": "MEDIUM",
-            "q": None,
-            "filter": {
-                "categorySlug": "emploi_offres-informatique-internet",
-                "origin": None,
-                "connected": False,
-                "delivery": None,
-                "regionIds": [],
-                "cityIds": [],
-                "priceRange": [None, None],
-                "exchange": None,
-                "hasPictures": False,
-                "hasPrice": False,
-                "priceUnit": None,
-                "fields": [],
-                "page": 1,
-                "orderByField": {"field": "REFRESHED_AT"},
-                "count": 48,
-            },
+    variables = {
+        "filter": {
+            "categorySlug": "emploi_offres-informatique-internet",
+            "origin": None,
+            "connected": False,
+            "delivery": None,
+            "regionIds": [],
+            "cityIds": [],
+            "priceRange": [None, None],
+            "exchange": None,
+            "hasPictures": False,
+            "hasPrice": False,
+            "priceUnit": None,
+            "fields": [],
+            "page": page,
+            "orderByField": {"field": "REFRESHED_AT"},
+            "count": config["page_size"],
         },
-        "query": query,
     }
+    data = _graphql_request("ouedkniss.com", OUEDKNISS_SEARCH_QUERY, variables, page=page)
+    if not data:
+        return
 
-    response = _make_request(config["url"], method="POST", json=payload)
-    if not response:
-        return []
-
-    offers = []
     try:
-        data = response.json().get("data", {}).get("search", {}).get("announcements", {}).get("data", [])
-        offers.extend(
-            {
-                "title": offer.get("title"),
-                "description": offer.get("description"),
-                "url": f"https://ouedkniss.com/{offer.get('slug')}-d{offer.get('id')}",
-                "published_at": offer.get("createdAt"),
-            }
-            for offer in data
-        )
+        data = (data.get("data") or {}).get("search", {}).get("announcements", {}).get("data", [])
+        for offer in data:
+            yield ScrapedItem(
+                title=offer.get("title"),
+                description=offer.get("description"),
+                url=f"https://ouedkniss.com/{offer.get('slug')}-d{offer.get('id')}",
+                published_at=offer.get("createdAt"),
+            )
 
     except Exception:
         logger.exception("Error parsing Ouedkniss offers")
-    return [o for o in offers if o.get("url")]
+        validator_cache.discard("ouedkniss.com")
+
+
+SOURCE_FETCHERS = {
+    **{source: partial(fetch_html_listing, source) for source in EXTRACTORS},
+    "emploitic.com": fetch_emploitic_jobs,
+    "bahr.sa": fetch_bahr_projects,
+    "ouedkniss.com": fetch_ouedkniss_offers,
+}
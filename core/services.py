@@ -1,73 +1,489 @@
 import logging
-from typing import Any
+import threading
+import time
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextvars import copy_context
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from typing import NamedTuple
 
+from django.conf import settings
+from django.db import connections
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.dedup import KnownUrlIndex
+from core.fetch import retry_deadline
+from core.models import DailySourceCount
+from core.models import Lease
 from core.models import Project
-from core.scrapers import fetch_baaeed_jobs
-from core.scrapers import fetch_bahr_projects
-from core.scrapers import fetch_emploitic_jobs
-from core.scrapers import fetch_mostaql_projects
+from core.models import SourceState
+from core.models import content_hash
+from core.scrapers import SOURCE_FETCHERS
+from core.scrapers import SOURCES_CONFIG
+from core.scrapers import FetchError
+from core.scrapers import ScrapedItem
+from core.scrapers import validator_cache
+from core.stats import bump_stats_version
 
 logger = logging.getLogger(__name__)
 
+known_urls = KnownUrlIndex(settings.KNOWN_URLS_MAX)
+
+REFRESH_LEASE = "refresh"
+
+# Fields of a project that are updated when its source edits it
+CONTENT_FIELDS = ["title", "description", "published_at", "published_day", "content_hash"]
+
+# Number of the latest stored URLs of a source its high-water mark is checked against
+HIGH_WATER_MARK_URLS = 200
+
+
+def enabled_sources() -> list[str]:
+    return [source for source, config in SOURCES_CONFIG.items() if config["enabled"]]
 
-def get_new_projects():
+
+class HighWaterMark(NamedTuple):
     """
-    Fetch new projects from multiple sources and save them to the database.
+    Newest publication date and latest URLs stored for a source, where crawling it can stop.
     """
-    # Define all source fetchers with their function references
-    source_fetchers = [
-        # fetch_nafezly_projects,
-        fetch_baaeed_jobs,
-        fetch_emploitic_jobs,
-        fetch_bahr_projects,
-        # fetch_ouedkniss_offers,
-        fetch_mostaql_projects,
-    ]
 
-    all_projects = []
-    for fetcher in source_fetchers:
-        projects = fetcher()
-        all_projects.extend(process_projects(projects))
+    published_at: datetime | None
+    urls: frozenset[str]
+
+    def is_reached(self, projects: list[ScrapedItem]) -> bool:
+        for project in projects:
+            if project.url in self.urls:
+                return True
+            published_at = _to_datetime(project.published_at)
+            # Projects published at the same time as the newest one may still be new.
+            if published_at and self.published_at and published_at < self.published_at:
+                return True
+        return False
 
-    if not all_projects:
-        logger.info("No new projects found")
 
+def high_water_marks(sources: list[str]) -> dict[str, HighWaterMark]:
+    latest = dict(
+        Project.objects.filter(source__in=sources).values_list("source").annotate(Max("published_at")).order_by(),
+    )
+    marks = {}
+    for source in sources:
+        urls = Project.objects.filter(source=source).order_by("-id").values_list("url", flat=True)
+        marks[source] = HighWaterMark(latest.get(source), frozenset(urls[:HIGH_WATER_MARK_URLS]))
+    return marks
+
+
+def crawl_source(source: str, mark: HighWaterMark | None = None) -> list[ScrapedItem]:
+    """
+    Fetches the listing of a source page by page, until a page reaches its high-water mark.
+
+    Follow-up pages are fetched SCRAPERS_PAGES_PER_BATCH at a time, up to
+    SCRAPERS_MAX_PAGES pages. Without a mark, only the first page is fetched.
+    """
+    fetcher = SOURCE_FETCHERS[source]
+    # Follow-up pages are fetched in the context of the crawl, with its retry deadline.
+    context = copy_context()
+
+    def fetch_page(page):
+        return context.copy().run(lambda: list(fetcher(page)))
+
+    projects = fetch_page(1)
+    if mark is None or not projects or mark.is_reached(projects):
+        return projects
+
+    last_page = 1
+    batch_size = settings.SCRAPERS_PAGES_PER_BATCH
+    with ThreadPoolExecutor(max_workers=batch_size, thread_name_prefix=f"crawl-{source}") as executor:
+        while last_page < settings.SCRAPERS_MAX_PAGES:
+            pages = range(last_page + 1, min(last_page + batch_size, settings.SCRAPERS_MAX_PAGES) + 1)
+            for page, page_projects in zip(pages, executor.map(fetch_page, pages), strict=True):
+                last_page = page
+                projects.extend(page_projects)
+                if not page_projects or mark.is_reached(page_projects):
+                    logger.debug("Crawled %d pages of %s", last_page, source)
+                    return projects
+    logger.info("Crawled %s up to the %d pages limit without reaching stored projects", source, last_page)
+    return projects
+
+
+def fetch_sources(
+    sources: list[str],
+    deadline: float,
+    marks: dict[str, HighWaterMark] | None = None,
+) -> Iterator[tuple[str, list[ScrapedItem]]]:
+    """
+    Crawl the given sources concurrently.
+
+    Yields `(source, projects)` as each source is done. Sources still running once
+    `deadline` seconds have elapsed are skipped and logged. The deadline only applies
+    to fetching: the time the caller takes with each yielded source doesn't count
+    against the sources fetched meanwhile.
+
+    Memory isn't flat in the number of pages and sources: a source's listing, up to
+    SCRAPERS_MAX_PAGES pages, is held whole until it's yielded, as are the sources done
+    while the caller handles one. It's released once the caller is done with it.
+    """
+    if not sources:
+        return
+
+    marks = marks or {}
+    end = time.monotonic() + deadline
+    # Failed requests aren't retried past the deadline, in the crawls it abandons either.
+    context = copy_context()
+    context.run(retry_deadline.set, end)
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="fetch")
+    futures = {
+        executor.submit(context.copy().run, crawl_source, source, marks.get(source)): source for source in sources
+    }
+    pending = set(futures)
     try:
-        created_projects = Project.objects.bulk_create(
-            all_projects,
-            ignore_conflicts=True,
+        while pending:
+            # Past the deadline, still collects the sources that are done by now.
+            done, pending = wait(pending, timeout=max(end - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            while done:
+                future = done.pop()
+                # Drops the reference to the listing, only the caller's is left.
+                source = futures.pop(future)
+                try:
+                    yield source, future.result()
+                except FetchError:
+                    pass  # Already logged with the failed request
+                except Exception:
+                    logger.exception("Error when fetching %s", source)
+        if pending:
+            missed = sorted(futures[future] for future in pending)
+            logger.warning("Skipped %s: missed the %ss fetch deadline", ", ".join(missed), deadline)
+    finally:
+        # Don't wait for the stragglers, their results are discarded anyway.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def refresh_projects() -> int | None:
+    """
+    Runs get_new_projects() unless a refresh is already running, in any process, or the
+    last one finished less than SCRAPERS_REFRESH_MIN_INTERVAL seconds ago.
+
+    Returns:
+        Number of new projects, or None when the refresh was skipped
+    """
+    acquired = Lease.objects.acquire(
+        REFRESH_LEASE,
+        # Frees the lease of a refresh whose process died
+        ttl=timedelta(seconds=settings.SCRAPERS_DEADLINE * 3),
+        min_interval=timedelta(seconds=settings.SCRAPERS_REFRESH_MIN_INTERVAL),
+    )
+    if not acquired:
+        logger.info(
+            "Skipped refresh: one is running or finished less than %ss ago",
+            settings.SCRAPERS_REFRESH_MIN_INTERVAL,
         )
-        logger.info("Created %d new projects", len(created_projects))
+        return None
+    try:
+        return get_new_projects()
+    finally:
+        Lease.objects.release(REFRESH_LEASE)
+
+
+def refresh_projects_in_background() -> bool:
+    """
+    Starts refresh_projects() in a background thread, if a refresh is due.
+
+    Lets a request serve the projects already stored right away, while they're refreshed
+    for the following ones (stale-while-revalidate).
+
+    Returns:
+        Whether a refresh was started
+    """
+    min_interval = timedelta(seconds=settings.SCRAPERS_REFRESH_MIN_INTERVAL)
+    lease = Lease.objects.filter(name=REFRESH_LEASE)
+    if lease.exists() and not lease.available(min_interval).exists():
+        return False
+    threading.Thread(target=_refresh_in_thread, name="refresh", daemon=True).start()
+    return True
+
+
+def _refresh_in_thread():
+    try:
+        refresh_projects()
     except Exception:
-        logger.exception("Error when bulk creating new projects")
-    else:
-        return created_projects
-    return []
+        logger.exception("Error when refreshing projects")
+    finally:
+        # The thread's own database connections would otherwise be left open.
+        connections.close_all()
+
+
+def get_new_projects() -> int:
+    """
+    Fetch new projects from all enabled sources and save them to the database.
+
+    Only the sources due according to their SourceState are polled. Each source is saved
+    in its own transaction as soon as it's fetched, so a failing source doesn't lose the
+    projects of the others, and its listing is only remembered as seen once saved. In the
+    "upsert" ingest mode, stored projects whose content changed on their source are updated too.
+
+    Returns:
+        Number of new projects
+    """
+    sources = enabled_sources()
+    states = source_states(sources)
+    now = timezone.now()
+    due = [source for source in sources if states[source].is_due(now)]
+    for source in sorted(set(sources) - set(due)):
+        logger.info("Skipped %s: next poll due in %s", source, _round_duration(states[source].next_due_at - now))
+    for source in due:
+        if states[source].validators:
+            validator_cache.load(source, states[source].validators)
+
+    created, updated = 0, 0
+    created_per_source = {}
+    for source, projects in fetch_sources(due, settings.SCRAPERS_DEADLINE, high_water_marks(due)):
+        try:
+            source_created, source_updated = save_scraped_projects(projects)
+        except Exception:
+            logger.exception("Error when saving the projects of %s", source)
+            continue
+        validators = validator_cache.commit(source)
+        if validators:
+            states[source].validators = validators
+        created_per_source[source] = source_created
+        created += source_created
+        updated += source_updated
+    update_source_states([states[source] for source in due], created_per_source)
+
+    if created or updated:
+        bump_stats_version()
+    if not created:
+        logger.info("No new projects found")
+    logger.info("Created %d new projects, updated %d changed ones", created, updated)
+    return created
 
 
-def process_projects(projects: list[dict[Any, Any]]) -> list[Project]:
+def source_states(sources: list[str]) -> dict[str, SourceState]:
+    SourceState.objects.bulk_create([SourceState(source=source) for source in sources], ignore_conflicts=True)
+    return SourceState.objects.in_bulk(sources, field_name="source")
+
+
+def update_source_states(states: list[SourceState], created_per_source: dict[str, int]):
+    """
+    Schedules the next poll of the given polled sources, the ones missing from
+    `created_per_source` having failed.
+    """
+    now = timezone.now()
+    for state in states:
+        if state.source in created_per_source:
+            state.record_poll(now, created_per_source[state.source])
+            logger.info(
+                "Polled %s: %d new projects, %.1f per hour, next poll in %s",
+                state.source,
+                created_per_source[state.source],
+                state.rate or 0,
+                _round_duration(state.interval),
+            )
+        else:
+            state.record_failure(now)
+            logger.warning(
+                "Polling %s failed %d times in a row, next poll in %s",
+                state.source,
+                state.consecutive_failures,
+                _round_duration(state.next_due_at - now),
+            )
+    SourceState.objects.bulk_update(
+        states,
+        [
+            "last_polled_at",
+            "last_new_at",
+            "rate",
+            "consecutive_failures",
+            "interval",
+            "next_due_at",
+            "etag",
+            "last_modified",
+            "body_hash",
+            "updated",
+        ],
+    )
+
+
+def _round_duration(duration: timedelta) -> timedelta:
+    return timedelta(seconds=round(duration.total_seconds()))
+
+
+def save_scraped_projects(projects: list[ScrapedItem]) -> tuple[int, int]:
+    """
+    Saves the scraped projects of a source in one transaction, SCRAPERS_BATCH_SIZE at a time.
+
+    Returns:
+        Number of created and updated projects
+    """
+    created, updated, hashes = 0, 0, {}
+    with transaction.atomic():
+        for start in range(0, len(projects), settings.SCRAPERS_BATCH_SIZE):
+            batch = projects[start : start + settings.SCRAPERS_BATCH_SIZE]
+            new_projects, changed_projects, previous_days = split_scraped_projects(batch)
+            # Conflicts can only come from projects saved concurrently since they were filtered.
+            created_projects = Project.objects.bulk_create(new_projects, ignore_conflicts=True)
+            updated_projects = []
+            if changed_projects and settings.SCRAPERS_INGEST_MODE == "upsert":
+                updated_projects = Project.objects.bulk_create(
+                    changed_projects,
+                    update_conflicts=True,
+                    unique_fields=["url"],
+                    update_fields=[*CONTENT_FIELDS, "updated"],
+                )
+            recount_daily_counts(
+                {(project.published_day, project.source) for project in created_projects + updated_projects}
+                | (previous_days if updated_projects else set()),
+            )
+            hashes.update((project.url, project.content_hash) for project in created_projects + changed_projects)
+            created += len(created_projects)
+            updated += len(updated_projects)
+    known_urls.add(hashes)
+    return created, updated
+
+
+def split_scraped_projects(
+    projects: Iterable[ScrapedItem],
+) -> tuple[list[Project], list[Project], set[tuple[date | None, str]]]:
+    """
+    Sorts out the scraped projects that are new from the stored ones whose content changed.
+
+    URLs and content hashes are first looked up in the in-memory index of known projects,
+    and only the remaining ones in the database. Unchanged and repeated projects are dropped
+    before any model is built.
+
+    Returns:
+        The new projects, the changed ones, and the (published_day, source) pairs the
+        changed ones were stored under
+    """
+    by_url = {}
+    for project in projects:
+        by_url.setdefault(project.url, project)
+    hashes = {
+        url: content_hash(project.title, project.description, _to_datetime(project.published_at))
+        for url, project in by_url.items()
+    }
+    candidates = known_urls.unknown(hashes)
+    stored = {}
+    if candidates:
+        stored = {
+            url: (stored_hash, (day, source))
+            for url, stored_hash, day, source in Project.objects.filter(url__in=candidates).values_list(
+                "url",
+                "content_hash",
+                "published_day",
+                "source",
+            )
+        }
+    known_urls.add({url: stored_hash for url, (stored_hash, _) in stored.items()})
+
+    changed = [url for url in candidates if url in stored and stored[url][0] != hashes[url]]
+    new_projects = list(process_projects(by_url[url] for url in candidates if url not in stored))
+    changed_projects = list(process_projects(by_url[url] for url in changed))
+    return new_projects, changed_projects, {stored[url][1] for url in changed}
+
+
+def process_projects(projects: Iterable[ScrapedItem]) -> Iterator[Project]:
     """
     Process projects from various sources into Project model instances.
 
     Args:
-        projects: List of project dictionaries from a source
+        projects: Projects scraped from a source
 
-    Returns:
-        List of Project model instances ready to be created
+    Yields:
+        Project model instances ready to be created
     """
-    result = []
     for project in projects:
-        # Create a new Project instance
         new_project = Project(
-            title=project["title"],
-            description=project.get("description", ""),
-            url=project["url"],
+            title=project.title,
+            description=project.description or "",
+            url=project.url,
+            published_at=_to_datetime(project.published_at),
         )
+        new_project.set_derived_fields()
+        yield new_project
+
+
+def _to_datetime(value: datetime | str | None) -> datetime | None:
+    """
+    Converts the published_at of a source, which API sources give as an ISO 8601 string, to an aware datetime.
+    """
+    if isinstance(value, str):
+        try:
+            value = parse_datetime(value)
+        except ValueError:
+            logger.warning("Could not parse datetime string '%s'", value)
+            return None
+    if value and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
 
-        # Set published_at if available
-        if "published_at" in project:
-            new_project.published_at = project["published_at"]
 
-        result.append(new_project)
+def recount_daily_counts(keys: set[tuple[date | None, str]]):
+    """
+    Recounts the DailySourceCount rows of the given (day, source) pairs.
+
+    Only the touched pairs are recounted, through the (published_day, source) index. Counts
+    are recomputed rather than incremented, so they stay right whatever the inserts and
+    upserts that touched them, e.g. a project moved to another day by its source.
+    """
+    if not keys:
+        return
+
+    days_filter = Q(published_day__in={day for day, _ in keys if day is not None})
+    if any(day is None for day, _ in keys):
+        days_filter |= Q(published_day__isnull=True)
+    recounted = (
+        Project.objects.filter(days_filter, source__in={source for _, source in keys})
+        .values_list("published_day", "source")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    counts = {(day, source): count for day, source, count in recounted}
+
+    DailySourceCount.objects.bulk_create(
+        [
+            DailySourceCount(day=day, source=source, count=counts.get((day, source), 0))
+            for day, source in keys
+            if day is not None
+        ],
+        update_conflicts=True,
+        unique_fields=["day", "source"],
+        update_fields=["count", "updated"],
+    )
+    # NULLs never conflict in the unique constraint, so undated counts are upserted one by one.
+    for day, source in keys:
+        if day is None:
+            DailySourceCount.objects.update_or_create(
+                day=None,
+                source=source,
+                defaults={"count": counts.get((None, source), 0)},
+            )
+
 
-    return result
+def rebuild_daily_counts() -> int:
+    """
+    Recomputes every DailySourceCount row from the projects table.
+
+    Returns:
+        Number of rollup rows written
+    """
+    counts = Project.objects.values_list("published_day", "source").annotate(count=Count("id")).order_by()
+    with transaction.atomic():
+        DailySourceCount.objects.all().delete()
+        rows = DailySourceCount.objects.bulk_create(
+            (DailySourceCount(day=day, source=source, count=count) for day, source, count in counts),
+            batch_size=1000,
+        )
+    bump_stats_version()
+    return len(rows)
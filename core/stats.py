@@ -0,0 +1,57 @@
+import time
+from collections.abc import Iterable
+from collections.abc import Sequence
+from datetime import date
+from datetime import timedelta
+
+from django.core.cache import cache
+
+STATS_VERSION_KEY = "stats:version"
+
+
+def get_stats_version() -> int:
+    """Version of the stats data, part of the cache keys of everything derived from it."""
+    return cache.get_or_set(STATS_VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_stats_version():
+    """Invalidates the cached stats, to be called whenever projects are added."""
+    try:
+        cache.incr(STATS_VERSION_KEY)
+    except ValueError:
+        # Start again from a fresh value rather than 1, which entries cached before the key
+        # was evicted may have been stored under.
+        cache.set(STATS_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def day_range(start: date, end: date) -> list[date]:
+    """Days from start to end, both included."""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def pivot_daily_counts(
+    rows: Iterable[tuple[str, date, int]],
+    sources: Sequence[str],
+    days: Sequence[date],
+) -> list[list[int]]:
+    """
+    Arranges `(source, day, count)` rows into a sources by days matrix in a single pass.
+
+    Args:
+        rows: Counts per source and day, in any order; pairs seen several times are summed
+        sources: Sources of the matrix rows, in order
+        days: Days of the matrix columns, in order; they don't have to be contiguous
+
+    Returns:
+        One list of counts per source, with one count per day. Rows whose source or day
+        isn't part of the matrix are ignored.
+    """
+    source_index = {source: i for i, source in enumerate(sources)}
+    day_index = {day: i for i, day in enumerate(days)}
+    matrix = [[0] * len(days) for _ in sources]
+    for source, day, count in rows:
+        i = source_index.get(source)
+        j = day_index.get(day)
+        if i is not None and j is not None:
+            matrix[i][j] += count
+    return matrix
@@ -1 +1,874 @@
-# Create your tests here.
+import json
+import threading
+import time
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+import requests
+from bs4 import BeautifulSoup
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.dedup import KnownUrlIndex
+from core.fetch import FetchClient
+from core.fetch import LatencyWindow
+from core.fetch import RateLimitedError
+from core.fetch import ResponseTooLargeError
+from core.fetch import RetryPolicy
+from core.fetch import TokenBucket
+from core.fetch import ValidatorCache
+from core.fetch import retry_deadline
+from core.models import DailySourceCount
+from core.models import Lease
+from core.models import Project
+from core.models import SourceState
+from core.pagination import KeysetPaginator
+from core.scrapers import SOURCE_FETCHERS
+from core.scrapers import SOURCES_CONFIG
+from core.scrapers import ScrapedItem
+from core.scrapers import _parse_html
+from core.scrapers import _parse_published_at
+from core.scrapers import fetch_bahr_projects
+from core.scrapers import fetch_client
+from core.scrapers import fetch_html_listing
+from core.scrapers import fetch_ouedkniss_offers
+from core.services import HighWaterMark
+from core.services import crawl_source
+from core.services import fetch_sources
+from core.services import get_new_projects
+from core.services import process_projects
+from core.services import rebuild_daily_counts
+from core.services import refresh_projects
+from core.services import refresh_projects_in_background
+from core.services import save_scraped_projects
+from core.stats import bump_stats_version
+from core.stats import day_range
+from core.stats import pivot_daily_counts
+from core.views import get_new_projects_stats
+
+
+class FetchSourcesTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def slow_fetcher(self, page):
+        self.release.wait(5)
+        return [ScrapedItem(title="Late", url="https://slow.example/1")]
+
+    def test_skips_sources_missing_the_deadline(self):
+        fetchers = {
+            "fast.example": lambda page: [ScrapedItem(title="Fast", url="https://fast.example/1")],
+            "slow.example": self.slow_fetcher,
+        }
+        with (
+            mock.patch.dict(SOURCE_FETCHERS, fetchers, clear=True),
+            self.assertLogs("core.services", "WARNING") as logs,
+        ):
+            results = list(fetch_sources(["fast.example", "slow.example"], deadline=0.2))
+
+        assert results == [("fast.example", [ScrapedItem(title="Fast", url="https://fast.example/1")])]
+        assert "slow.example" in logs.output[0]
+
+    def test_time_spent_on_results_does_not_count_against_the_deadline(self):
+        fetchers = {
+            "fast.example": lambda page: [ScrapedItem(title="Fast", url="https://fast.example/1")],
+            "slower.example": lambda page: time.sleep(0.1) or [],
+            "slow.example": self.slow_fetcher,
+        }
+        with (
+            mock.patch.dict(SOURCE_FETCHERS, fetchers, clear=True),
+            self.assertLogs("core.services", "WARNING") as logs,
+        ):
+            results = []
+            for source, _projects in fetch_sources(["fast.example", "slower.example", "slow.example"], deadline=0.3):
+                results.append(source)
+                time.sleep(0.4)  # Saving a source takes longer than the deadline
+
+        assert sorted(results) == ["fast.example", "slower.example"]
+        assert logs.output == ["WARNING:core.services:Skipped slow.example: missed the 0.3s fetch deadline"]
+
+    @override_settings(SCRAPERS_MAX_PAGES=2)
+    def test_crawls_stop_retrying_at_the_deadline(self):
+        def fetcher(page):
+            return [ScrapedItem(title=str(retry_deadline.get()), url=f"https://a.example/{page}")]
+
+        marks = {"a.example": HighWaterMark(None, frozenset())}
+        started = time.monotonic()
+        with mock.patch.dict(SOURCE_FETCHERS, {"a.example": fetcher}, clear=True):
+            [(_source, projects)] = fetch_sources(["a.example"], deadline=1, marks=marks)
+
+        assert [project.url for project in projects] == ["https://a.example/1", "https://a.example/2"]
+        assert all(started + 1 <= float(project.title) <= time.monotonic() + 1 for project in projects)
+        assert retry_deadline.get() is None
+
+    def test_failing_source_does_not_drop_the_others(self):
+        fetchers = {
+            "broken.example": mock.Mock(side_effect=ValueError),
+            "fast.example": lambda page: [],
+        }
+        with mock.patch.dict(SOURCE_FETCHERS, fetchers, clear=True), self.assertLogs("core.services", "ERROR"):
+            results = list(fetch_sources(["broken.example", "fast.example"], deadline=1))
+
+        assert results == [("fast.example", [])]
+
+
+class CrawlSourceTests(SimpleTestCase):
+    def setUp(self):
+        pages = {page: [ScrapedItem(title=str(page), url=f"https://a.example/{page}")] for page in range(1, 6)}
+        self.fetcher = mock.Mock(side_effect=lambda page: pages[page])
+        patcher = mock.patch.dict(SOURCE_FETCHERS, {"a.example": self.fetcher})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetched_pages(self):
+        return sorted(call.args[0] for call in self.fetcher.call_args_list)
+
+    @override_settings(SCRAPERS_MAX_PAGES=5, SCRAPERS_PAGES_PER_BATCH=1)
+    def test_stops_at_the_high_water_mark(self):
+        projects = crawl_source("a.example", HighWaterMark(None, frozenset({"https://a.example/3"})))
+
+        assert [project.title for project in projects] == ["1", "2", "3"]
+        assert self.fetched_pages() == [1, 2, 3]
+
+    @override_settings(SCRAPERS_MAX_PAGES=4, SCRAPERS_PAGES_PER_BATCH=2)
+    def test_stops_at_the_pages_limit(self):
+        with self.assertLogs("core.services", "INFO"):
+            projects = crawl_source("a.example", HighWaterMark(None, frozenset()))
+
+        assert [project.title for project in projects] == ["1", "2", "3", "4"]
+        assert self.fetched_pages() == [1, 2, 3, 4]
+
+
+class PollSourcesCommandTests(SimpleTestCase):
+    def test_once_polls_a_single_time(self):
+        with mock.patch("core.management.commands.poll_sources.refresh_projects") as refresh_projects:
+            call_command("poll_sources", "--once")
+
+        refresh_projects.assert_called_once_with()
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/throttled":
+            self.send_response(429)
+            self.send_header("Retry-After", "30")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/flaky" and self.server.failures:
+            self.server.failures -= 1
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/slow" and self.server.slow_requests:
+            self.server.slow_requests -= 1
+            time.sleep(1)
+        body = self.headers["User-Agent"].encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchClientTests(SimpleTestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        server.failures = server.slow_requests = 0
+        self.server = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}/"
+
+    def test_reuses_connections_across_threads(self):
+        client = FetchClient(headers={"User-Agent": "work-pulse-test"}, pool_maxsize=1)
+        assert client.request("GET", self.url).text == "work-pulse-test"
+        thread = threading.Thread(target=client.request, args=("GET", self.url))
+        thread.start()
+        thread.join()
+
+        assert client.connection_stats() == {"127.0.0.1": {"requests": 2, "connections": 1, "reused": 1}}
+
+    def test_drops_responses_larger_than_allowed(self):
+        client = FetchClient(headers={"User-Agent": "work-pulse-test"}, max_bytes=10)
+        with self.assertRaises(ResponseTooLargeError):  # noqa: PT027 - tests run with Django's runner
+            client.request("GET", self.url)
+
+        client.set_max_bytes("127.0.0.1", 100)
+        assert client.request("GET", self.url).content == b"work-pulse-test"
+        assert client.bytes_received() == {"127.0.0.1": len(b"work-pulse-test")}
+
+    def test_pauses_hosts_asking_to_slow_down(self):
+        client = FetchClient(timeout=5)
+        client.limit("127.0.0.1", requests_per_second=100, burst=5)
+        with self.assertLogs("core.fetch", "WARNING") as logs:
+            assert client.request("GET", f"{self.url}throttled").status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert logs.output == ["WARNING:core.fetch:127.0.0.1 asked to slow down, pausing requests to it for 30s"]
+
+        with self.assertRaises(RateLimitedError):  # noqa: PT027 - tests run with Django's runner
+            client.request("GET", self.url)
+
+    def test_retries_server_errors(self):
+        client = FetchClient()
+        client.set_retry_policy("127.0.0.1", RetryPolicy(backoff=0))
+        self.server.failures = 2
+        assert client.request("GET", f"{self.url}flaky").status_code == HTTPStatus.OK
+
+        self.server.failures = 3
+        assert client.request("GET", f"{self.url}flaky").status_code == HTTPStatus.BAD_GATEWAY
+        assert client.retry_stats() == {"127.0.0.1": {"retries": 4, "hedges": 0, "hedges_won": 0}}
+
+    def test_hedges_slow_requests(self):
+        client = FetchClient()
+        client.set_retry_policy("127.0.0.1", RetryPolicy(hedge_percentile=90))
+        for _ in range(LatencyWindow.MIN_SAMPLES):
+            client.request("GET", self.url)
+        self.server.slow_requests = 1
+
+        started = time.perf_counter()
+        assert client.request("GET", f"{self.url}slow").ok
+        assert time.perf_counter() - started < 1
+        assert client.retry_stats() == {"127.0.0.1": {"retries": 0, "hedges": 1, "hedges_won": 1}}
+
+    def test_stops_retrying_at_the_deadline(self):
+        client = FetchClient()
+        client.set_retry_policy("127.0.0.1", RetryPolicy(backoff=0))
+        self.server.failures = 1
+        token = retry_deadline.set(time.monotonic())
+        self.addCleanup(retry_deadline.reset, token)
+
+        assert client.request("GET", f"{self.url}flaky").status_code == HTTPStatus.BAD_GATEWAY
+        assert client.retry_stats() == {}
+
+    def test_hedges_only_with_a_free_slot(self):
+        client = FetchClient()
+        client.limit("127.0.0.1", requests_per_second=100, burst=20, max_in_flight=1)
+        client.set_retry_policy("127.0.0.1", RetryPolicy(hedge_percentile=90))
+        for _ in range(LatencyWindow.MIN_SAMPLES):
+            client.request("GET", self.url)
+        self.server.slow_requests = 1
+
+        assert client.request("GET", f"{self.url}slow").ok
+        assert client.retry_stats() == {}
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_spaces_requests_after_a_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        assert bucket.reserve(max_wait=1) == 0
+        assert bucket.reserve(max_wait=1) == 0
+        assert 0 < bucket.reserve(max_wait=1) <= 1 / bucket.rate
+        with self.assertRaises(RateLimitedError):  # noqa: PT027 - tests run with Django's runner
+            bucket.reserve(max_wait=1 / bucket.rate)
+
+
+def make_response(status_code=200, content=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content  # noqa: SLF001
+    response.headers.update(headers or {})
+    return response
+
+
+class ValidatorCacheTests(SimpleTestCase):
+    def test_detects_unchanged_listings(self):
+        cache = ValidatorCache()
+        assert not cache.is_unchanged("a.example", make_response(content=b"1", headers={"ETag": '"v1"'}))
+        assert cache.conditional_headers("a.example") == {}
+        cache.commit("a.example")
+        assert cache.conditional_headers("a.example") == {"If-None-Match": '"v1"'}
+        assert cache.is_unchanged("a.example", make_response(status_code=304))
+        assert cache.is_unchanged("a.example", make_response(content=b"1"))
+        assert not cache.is_unchanged("a.example", make_response(content=b"2"))
+        # Until "2" is saved, the listing is still compared with "1"
+        assert not cache.is_unchanged("a.example", make_response(content=b"2"))
+        assert cache.is_unchanged("a.example", make_response(content=b"1"))
+
+        assert cache.stats() == {"a.example": {"hits": 3, "misses": 3}}
+
+    def test_listing_is_parsed_again_until_saved(self):
+        project = {"id": 1, "project": {"title": "1", "description": ""}, "createdAt": "2025-03-01 10:00:00"}
+        response = make_response(content=json.dumps({"data": {"recruitments": [project]}}).encode())
+        with (
+            mock.patch("core.scrapers.validator_cache", ValidatorCache()) as cache,
+            mock.patch("core.scrapers._make_request", return_value=response),
+        ):
+            assert len(list(fetch_bahr_projects())) == 1
+            assert len(list(fetch_bahr_projects())) == 1
+            cache.commit("bahr.sa")
+            assert list(fetch_bahr_projects()) == []
+
+
+MOSTAQL_LISTING = """
+<html><head><meta charset="utf-8"><title>مستقل</title></head>
+<body>
+<nav><a href="/projects">مشاريع</a></nav>
+<table class="table projects-table"><tbody>
+<tr>
+<td><h2 class="card--title"><a href="https://mostaql.com/project/1-متجر">تطوير متجر</a></h2>
+<p class="project__brief"><a href="https://mostaql.com/project/1-متجر">متجر إلكتروني</a></p>
+<time datetime="2025-03-01 10:00:00">منذ ساعة</time></td>
+</tr>
+</tbody></table>
+<footer><time datetime="2025-01-01 00:00:00"></time></footer>
+</body></html>
+"""
+
+NAFEZLY_LISTING = """
+<html><head><meta charset="utf-8"><title>نفذلي</title></head>
+<body>
+<nav><a class="text-truncate" href="/projects">المشاريع</a></nav>
+<div class="row">
+<div class="col-12 project-box">
+<a class="text-truncate kufi" href="https://nafezly.com/project/11-api">ربط API</a>
+<h3 class="naskh">ربط متجر بواجهة برمجية</h3>
+</div>
+<div class="col-12 project-box">
+<a class="text-truncate kufi">مشروع محذوف</a>
+</div>
+<div class="col-12 project-box">
+<a class="text-truncate kufi" href="https://nafezly.com/project/12-bot">بوت تيليجرام</a>
+</div>
+</div>
+<footer><h3>روابط</h3></footer>
+</body></html>
+"""
+
+BAAEED_LISTING = """
+<html><head><meta charset="utf-8"><title>بعيد</title></head>
+<body>
+<section class="hero"><h3 class="card-title"><a href="/remote-jobs">وظائف</a></h3></section>
+<section class="baaeed-card shadow">
+<table><tbody>
+<tr>
+<td class="baaeed-list__item--details">
+<h3 class="card-title"><a href="https://baaeed.com/remote-job/5">مطور بايثون</a></h3>
+</td>
+<td><p class="card-brief"><a href="https://baaeed.com/remote-job/5">خبرة في جانغو</a></p>
+<time datetime="12 مارس 2025 - 14:30:00 م">منذ يوم</time></td>
+</tr>
+<tr>
+<td class="baaeed-list__item--details">
+<h3 class="card-title"><a href="https://baaeed.com/remote-job/6">مصمم واجهات</a></h3>
+</td>
+<td><time datetime="3 يناير 2025 - 09:05:00 ص">منذ شهرين</time></td>
+</tr>
+</tbody></table>
+</section>
+</body></html>
+"""
+
+HTML_LISTINGS = {"mostaql.com": MOSTAQL_LISTING, "nafezly.com": NAFEZLY_LISTING, "baaeed.com": BAAEED_LISTING}
+
+
+def parse_whole_page(source, response):
+    """
+    The items of a listing as extracted before only its container was parsed: the whole
+    page parsed with html.parser, then matched with uncompiled selectors.
+    """
+    spec = SOURCES_CONFIG[source]["extract"]
+    soup = BeautifulSoup(response.text, "html.parser")
+    items = []
+    for row in soup.select(spec["rows"]):
+        item = {}
+        for name, field in spec["fields"].items():
+            selector, attr = (field, None) if isinstance(field, str) else field
+            target = row.select_one(selector)
+            if attr is None:
+                item[name] = target.text.strip() if target else ""
+            else:
+                item[name] = target[attr] if target and target.has_attr(attr) else None
+        if item["url"]:
+            if "published_at" in item:
+                item["published_at"] = _parse_published_at(spec, item["published_at"])
+            items.append(ScrapedItem(**item))
+    return items
+
+
+class HtmlScrapersTests(SimpleTestCase):
+    def test_parses_only_the_listing(self):
+        response = make_response(content=MOSTAQL_LISTING.encode())
+        with mock.patch("core.scrapers._fetch_listing", return_value=response):
+            projects = list(fetch_html_listing("mostaql.com"))
+
+        assert projects == [
+            ScrapedItem(
+                title="تطوير متجر",
+                url="https://mostaql.com/project/1-متجر",
+                description="متجر إلكتروني",
+                published_at=datetime(2025, 3, 1, 10, tzinfo=ZoneInfo("UTC")),
+            ),
+        ]
+
+    def test_output_matches_parsing_the_whole_page(self):
+        for source, listing in HTML_LISTINGS.items():
+            response = make_response(content=listing.encode(), headers={"Content-Type": "text/html; charset=utf-8"})
+            with self.subTest(source), mock.patch("core.scrapers._fetch_listing", return_value=response):
+                projects = list(fetch_html_listing(source))
+
+                assert projects
+                assert projects == parse_whole_page(source, response)
+                # The tree built for the listing container is smaller than the whole page's
+                whole_page = BeautifulSoup(response.content, "html.parser")
+                assert len(_parse_html(source, response).find_all(name=True)) < len(whole_page.find_all(name=True))
+
+
+def ouedkniss_offers(*ids):
+    offers = [{"id": offer_id, "slug": "dev", "title": "Dev"} for offer_id in ids]
+    return make_response(content=json.dumps({"data": {"search": {"announcements": {"data": offers}}}}).encode())
+
+
+class GraphqlScrapersTests(SimpleTestCase):
+    def setUp(self):
+        self.validator_cache = ValidatorCache()
+        for patcher in [
+            mock.patch("core.scrapers.validator_cache", self.validator_cache),
+            mock.patch("core.scrapers._persisted_queries_unsupported", set()),
+            mock.patch.object(fetch_client, "request"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def poll(self, *responses):
+        fetch_client.request.reset_mock()
+        fetch_client.request.side_effect = responses
+        return [offer.url for offer in fetch_ouedkniss_offers()]
+
+    def test_sends_the_query_when_its_hash_is_unknown(self):
+        not_found = make_response(content=b'{"errors": [{"message": "PersistedQueryNotFound"}]}')
+
+        assert self.poll(not_found, ouedkniss_offers("7")) == ["https://ouedkniss.com/dev-d7"]
+        first, second = (call.kwargs["json"] for call in fetch_client.request.call_args_list)
+        assert "query" not in first
+        assert second["extensions"] == first["extensions"]
+        assert "announcements" in second["query"]
+
+    def test_sends_the_query_when_the_probe_fails(self):
+        probes = [
+            make_response(status_code=400, content=b'{"errors": [{"message": "PersistedQueryNotFound"}]}'),
+            make_response(status_code=502, content=b"<html>Bad gateway</html>"),
+            make_response(content=b'{"errors": [{"message": "Must provide a query string."}]}'),
+        ]
+        for probe in probes:
+            with self.subTest(probe.status_code):
+                assert self.poll(probe, ouedkniss_offers(str(probe.status_code)))
+
+    def test_probe_answers_are_not_taken_for_the_listing(self):
+        not_found = make_response(content=b'{"errors": [{"message": "PersistedQueryNotFound"}]}')
+
+        assert self.poll(not_found, ouedkniss_offers("7")) == ["https://ouedkniss.com/dev-d7"]
+        self.validator_cache.commit("ouedkniss.com")
+        assert self.poll(not_found, ouedkniss_offers("7")) == []
+        self.validator_cache.commit("ouedkniss.com")
+        assert self.poll(not_found, ouedkniss_offers("7", "8")) == [
+            "https://ouedkniss.com/dev-d7",
+            "https://ouedkniss.com/dev-d8",
+        ]
+
+        assert self.validator_cache.stats() == {"ouedkniss.com": {"hits": 1, "misses": 2}}
+
+
+class ProcessProjectsTests(TestCase):
+    def test_fills_source_and_published_day(self):
+        [project] = process_projects(
+            [
+                ScrapedItem(
+                    title="Job",
+                    url="https://emploitic.com/offres-d-emploi/it/job",
+                    published_at="2025-03-01T23:30:00.000Z",
+                ),
+            ],
+        )
+
+        assert project.source == "emploitic.com"
+        # Days are counted in the local time zone (Africa/Algiers, UTC+1).
+        assert project.published_day == date(2025, 3, 2)
+
+
+@mock.patch("core.services.bump_stats_version", mock.Mock())
+class GetNewProjectsTests(TestCase):
+    def setUp(self):
+        self.known_urls = KnownUrlIndex(maxsize=10)
+        patcher = mock.patch("core.services.known_urls", self.known_urls)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Project.objects.bulk_create(process_projects([ScrapedItem(title="1", url="https://mostaql.com/project/1")]))
+
+    def poll(self, projects):
+        with (
+            mock.patch("core.services.high_water_marks", return_value={}),
+            mock.patch("core.services.fetch_sources", return_value=[("mostaql.com", projects)]),
+            self.assertLogs("core.services", "INFO") as logs,
+        ):
+            created = get_new_projects()
+        return created, logs.output[-1]
+
+    def test_only_new_projects_are_saved_and_counted(self):
+        projects = [
+            ScrapedItem(title="1", url="https://mostaql.com/project/1"),
+            ScrapedItem(title="2", url="https://mostaql.com/project/2"),
+            ScrapedItem(title="2 again", url="https://mostaql.com/project/2"),
+        ]
+
+        created, log = self.poll(projects)
+        assert created == 1
+        assert Project.objects.filter(title="2").exists()
+        assert log.endswith("Created 1 new projects, updated 0 changed ones")
+
+        # Known URLs are skipped without querying the database
+        with CaptureQueriesContext(connection) as queries:
+            created, log = self.poll(projects)
+        assert created == 0
+        assert not [query for query in queries if '"core_project"' in query["sql"]]
+        assert "https://mostaql.com/project/1" in self.known_urls
+
+    def test_listing_validators_outlive_the_process(self):
+        cache = ValidatorCache()
+        cache.is_unchanged("mostaql.com", make_response(content=b"1", headers={"ETag": '"v1"'}))
+        with mock.patch("core.services.validator_cache", cache):
+            self.poll([])
+        assert SourceState.objects.get(source="mostaql.com").etag == '"v1"'
+
+        # As seen by a new process
+        SourceState.objects.update(next_due_at=None)
+        cache = ValidatorCache()
+        with mock.patch("core.services.validator_cache", cache):
+            self.poll([])
+        assert cache.conditional_headers("mostaql.com") == {"If-None-Match": '"v1"'}
+        assert cache.is_unchanged("mostaql.com", make_response(content=b"1"))
+
+    def test_changed_projects_are_updated(self):
+        stored = Project.objects.get()
+        edited = ScrapedItem(title="1", url=stored.url, published_at="2025-03-01T10:00:00Z")
+
+        _created, log = self.poll([edited])
+
+        assert log.endswith("Created 0 new projects, updated 1 changed ones")
+        project = Project.objects.get()
+        assert project.published_day == date(2025, 3, 1)
+        assert project.updated > stored.updated
+        assert set(DailySourceCount.objects.values_list("day", "source", "count")) == {
+            (date(2025, 3, 1), "mostaql.com", 1),
+            (None, "mostaql.com", 0),
+        }
+
+    def test_sources_are_saved_independently(self):
+        fetched = [
+            ("nafezly.com", [ScrapedItem(title=None, url="https://nafezly.com/project/2")]),
+            ("mostaql.com", [ScrapedItem(title="3", url="https://mostaql.com/project/3")]),
+        ]
+        with (
+            mock.patch("core.services.high_water_marks", return_value={}),
+            mock.patch("core.services.fetch_sources", return_value=fetched),
+            self.assertLogs("core.services", "INFO") as logs,
+        ):
+            assert get_new_projects() == 1
+
+        assert "Error when saving the projects of nafezly.com" in logs.output[0]
+        assert Project.objects.filter(title="3").exists()
+
+    @override_settings(SCRAPERS_INGEST_MODE="insert")
+    def test_changed_projects_are_kept_in_insert_mode(self):
+        _created, log = self.poll([ScrapedItem(title="1 edited", url="https://mostaql.com/project/1")])
+
+        assert log.endswith("Created 0 new projects, updated 0 changed ones")
+        assert Project.objects.get().title == "1"
+
+
+@override_settings(SCRAPERS_SOURCE_MIN_INTERVAL=60, SCRAPERS_SOURCE_MAX_INTERVAL=3600, SCRAPERS_PROJECTS_PER_POLL=5)
+class SourceStateTests(SimpleTestCase):
+    def poll(self, state, new_counts):
+        now = timezone.now()
+        intervals = []
+        for new_count in new_counts:
+            state.record_poll(now, new_count)
+            intervals.append(state.interval.total_seconds())
+            now = state.next_due_at
+        return intervals
+
+    def test_interval_follows_the_posting_rate(self):
+        assert self.poll(SourceState(source="a.example"), [0, 10, 10, 10]) == [60, 60, 60, 60]
+        # Quiet sources are polled less and less often
+        assert self.poll(SourceState(source="b.example"), [0] * 7) == [60, 120, 240, 480, 960, 1920, 3600]
+
+    def test_failures_back_off(self):
+        state = SourceState(source="a.example")
+        now = timezone.now()
+        state.record_failure(now)
+        state.record_failure(now)
+
+        assert state.next_due_at - now == timedelta(minutes=4)
+        assert not state.is_due(now + timedelta(minutes=3))
+
+
+class RefreshProjectsTests(TestCase):
+    @override_settings(SCRAPERS_REFRESH_MIN_INTERVAL=60)
+    def test_single_refresh_at_a_time_and_minimum_interval(self):
+        running = []
+
+        def get_new_projects():
+            # A concurrent refresh, e.g. from another process, is skipped.
+            running.append(refresh_projects())
+            return 0
+
+        with (
+            mock.patch("core.services.get_new_projects", side_effect=get_new_projects) as mocked,
+            self.assertLogs("core.services", "INFO"),
+        ):
+            assert refresh_projects() == 0
+            assert running == [None]
+            # Too soon after the previous one
+            assert refresh_projects() is None
+            assert mocked.call_count == 1
+            assert not refresh_projects_in_background()
+
+            Lease.objects.update(released_at=timezone.now() - timedelta(seconds=61))
+            assert refresh_projects() == 0
+
+
+class NewProjectsStatsTests(TestCase):
+    def test_counts_unviewed_projects_in_one_query(self):
+        Project.objects.bulk_create(
+            process_projects(
+                [
+                    ScrapedItem(title="1", url="https://mostaql.com/project/1"),
+                    ScrapedItem(title="2", url="https://mostaql.com/project/2"),
+                    ScrapedItem(title="3", url="https://bahr.sa/en/projects/recruitments/3"),
+                ],
+            ),
+        )
+
+        with self.assertNumQueries(1):
+            stats = get_new_projects_stats(Project.objects.filter(viewed__isnull=True))
+
+        per_source = {
+            "mostaql.com": 2,
+            "nafezly.com": 0,
+            "emploitic.com": 0,
+            "baaeed.com": 0,
+            "bahr.sa": 1,
+            "ouedkniss.com": 0,
+        }
+        assert stats == (per_source, 3)
+
+
+class ProjectIndexTests(TestCase):
+    def explain(self, queryset):
+        if connection.vendor == "postgresql":
+            # The planner would rather scan a table this small sequentially.
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_new_projects_use_partial_index(self):
+        assert "project_new_idx" in self.explain(Project.objects.new())
+
+    def test_archived_projects_use_partial_index(self):
+        assert "project_archived_idx" in self.explain(Project.objects.archived())
+
+
+class DailySourceCountTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("core.services.known_urls", KnownUrlIndex(maxsize=10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ingest(self, projects):
+        save_scraped_projects(projects)
+
+    def rollup(self):
+        return set(DailySourceCount.objects.values_list("day", "source", "count"))
+
+    def test_counts_are_updated_incrementally(self):
+        self.ingest(
+            [
+                ScrapedItem(title="1", url="https://mostaql.com/project/1", published_at="2025-03-01T10:00:00Z"),
+                ScrapedItem(title="2", url="https://nafezly.com/project/2"),
+            ],
+        )
+        self.ingest(
+            [
+                # Already stored
+                ScrapedItem(title="1", url="https://mostaql.com/project/1", published_at="2025-03-01T10:00:00Z"),
+                ScrapedItem(title="3", url="https://mostaql.com/project/3", published_at="2025-03-01T11:00:00Z"),
+                ScrapedItem(title="4", url="https://nafezly.com/project/4"),
+            ],
+        )
+        # Moved to another day by its source
+        self.ingest(
+            [ScrapedItem(title="3", url="https://mostaql.com/project/3", published_at="2025-03-02T11:00:00Z")],
+        )
+
+        expected = {
+            (date(2025, 3, 1), "mostaql.com", 1),
+            (date(2025, 3, 2), "mostaql.com", 1),
+            (None, "nafezly.com", 2),
+        }
+        assert self.rollup() == expected
+        assert rebuild_daily_counts() == len(expected)
+        assert self.rollup() == expected
+
+
+class PivotDailyCountsTests(SimpleTestCase):
+    def test_builds_source_by_day_matrix(self):
+        days = day_range(date(2025, 2, 27), date(2025, 3, 2))
+        rows = [
+            ("b.example", date(2025, 3, 2), 4),
+            ("a.example", date(2025, 2, 27), 1),
+            ("a.example", date(2025, 2, 27), 2),
+            ("a.example", date(2025, 3, 3), 8),  # outside the range
+            ("c.example", date(2025, 3, 1), 16),  # unknown source
+        ]
+
+        assert pivot_daily_counts(rows, ["a.example", "b.example"], days) == [[3, 0, 0, 0], [0, 0, 0, 4]]
+
+
+class StatsViewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_until_new_projects_are_added(self):
+        self.client.get("/stats/")
+        with self.assertNumQueries(0):
+            self.client.get("/stats/", headers={"HX-Request": "true"})
+
+        bump_stats_version()
+        # The stats, and the polling state of the sources which isn't cached
+        with self.assertNumQueries(3):
+            self.client.get("/stats/")
+
+
+class MarkViewedBulkTests(TestCase):
+    def setUp(self):
+        Project.objects.bulk_create(
+            process_projects(
+                [
+                    ScrapedItem(title="1", url="https://mostaql.com/project/1", published_at="2025-03-01T10:00:00Z"),
+                    ScrapedItem(title="2", url="https://mostaql.com/project/2", published_at="2025-03-02T10:00:00Z"),
+                    ScrapedItem(title="3", url="https://mostaql.com/project/3", published_at="2025-03-03T10:00:00Z"),
+                ],
+            ),
+        )
+
+    def viewed_titles(self):
+        return set(Project.objects.archived().values_list("title", flat=True))
+
+    def test_marks_ids_with_one_update(self):
+        ids = list(Project.objects.filter(title__in=["1", "3"]).values_list("pk", flat=True))
+
+        with self.assertNumQueries(1):
+            response = self.client.post("/projects/mark-as-viewed/", {"ids": ids})
+
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.viewed_titles() == {"1", "3"}
+
+    def test_marks_projects_published_until(self):
+        response = self.client.post("/projects/mark-as-viewed/", {"until": "2025-03-02T11:00:00+01:00"})
+
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.viewed_titles() == {"1", "2"}
+
+    def test_rejects_invalid_ids(self):
+        response = self.client.post("/projects/mark-as-viewed/", {"ids": ["1", "x"]})
+
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert self.viewed_titles() == set()
+
+    def test_rejects_invalid_until(self):
+        for until in ["yesterday", "2025-02-30T00:00:00"]:
+            response = self.client.post("/projects/mark-as-viewed/", {"until": until})
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert self.viewed_titles() == set()
+
+
+class KeysetPaginatorTests(TestCase):
+    def test_walks_all_rows_across_ties(self):
+        projects = Project.objects.bulk_create(
+            process_projects(ScrapedItem(title=str(i), url=f"https://mostaql.com/project/{i}") for i in range(5)),
+        )
+        viewed = timezone.now()
+        # Two projects viewed at the same time, on both sides of a page boundary.
+        for project, seconds in zip(projects, [0, 10, 10, 20, 30], strict=True):
+            project.viewed = viewed - timedelta(seconds=seconds)
+        Project.objects.bulk_update(projects, ["viewed"])
+
+        paginator = KeysetPaginator(Project.objects.archived(), ["viewed", "id"], per_page=2)
+        titles, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            titles.extend(project.title for project in page.object_list)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        assert titles == ["0", "2", "1", "3", "4"]
+
+
+class HomeViewTests(TestCase):
+    def setUp(self):
+        Project.objects.bulk_create(
+            process_projects(
+                [
+                    ScrapedItem(title="Old", url="https://mostaql.com/project/1", published_at="2025-03-01T10:00:00Z"),
+                    ScrapedItem(title="Undated", url="https://nafezly.com/project/2", description="x" * 2000),
+                    ScrapedItem(title="New", url="https://mostaql.com/project/3", published_at="2025-03-02T10:00:00Z"),
+                ],
+            ),
+        )
+
+    @mock.patch("core.views.HOME_PAGE_SIZE", 2)
+    def test_feed_is_loaded_page_by_page(self):
+        response = self.client.get("/")
+        page = response.context["page"]
+        assert [project.title for project in page.object_list] == ["New", "Old"]
+        assert response.context["new_projects_total"] == len(page.object_list) + 1
+
+        response = self.client.get("/", {"cursor": page.next_cursor}, headers={"HX-Request": "true"})
+        content = response.content.decode()
+        assert "Undated" in content
+        assert "New" not in content
+        # Only the start of the long description is sent
+        assert "data-description-url" in content
+        assert "x" * 1001 not in content
+
+    def test_short_html_descriptions_keep_their_markup(self):
+        job = ScrapedItem(title="Job", url="https://emploitic.com/jobs/1", description="<ul><li>Python</li></ul>")
+        Project.objects.bulk_create(process_projects([job]))
+        response = self.client.get("/")
+
+        assert "<ul><li>Python</li></ul>" in response.content.decode()
+
+    @override_settings(SCRAPERS_REFRESH_ON_VISIT=True)
+    def test_visits_refresh_projects_in_the_background(self):
+        with mock.patch("core.views.refresh_projects_in_background") as refresh:
+            self.client.get("/")
+            self.client.get("/", headers={"HX-Request": "true"})
+
+        refresh.assert_called_once_with()
+
+    def test_full_description_is_loaded_on_demand(self):
+        project = Project.objects.get(title="Undated")
+
+        response = self.client.get(f"/projects/{project.pk}/description/")
+
+        assert response.status_code == HTTPStatus.OK
+        assert "x" * 2000 in response.content.decode()
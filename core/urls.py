@@ -2,13 +2,17 @@ from django.urls import path
 
 from core.views import home
 from core.views import mark_viewed
+from core.views import mark_viewed_bulk
 from core.views import project_archive_view
+from core.views import project_description
 from core.views import stats_view
 
 app_name = "core"
 urlpatterns = [
     path("", home, name="home"),
+    path("projects/mark-as-viewed/", mark_viewed_bulk, name="mark-viewed-bulk"),
     path("projects/<int:pk>/mark-as-viewed/", mark_viewed, name="mark-viewed"),
+    path("projects/<int:pk>/description/", project_description, name="project-description"),
     path("projects/archive/", project_archive_view, name="projects-archive"),
     path("stats/", stats_view, name="stats"),
 ]
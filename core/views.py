@@ -1,47 +1,85 @@
 from datetime import timedelta
 
-from django.core.paginator import EmptyPage
-from django.core.paginator import Paginator
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count
-from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
 from django.db.models import TextChoices
-from django.db.models import Value
-from django.db.models.functions import StrIndex
-from django.db.models.functions import Substr
-from django.db.models.functions import TruncDate
+from django.db.models.functions import Left
 from django.http import HttpResponse
+from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_POST
 from django.views.generic import TemplateView
 
+from core.models import DailySourceCount
 from core.models import Project
+from core.models import SourceState
+from core.pagination import InvalidCursorError
+from core.pagination import KeysetPaginator
 from core.scrapers import SOURCES_CONFIG
-from core.services import get_new_projects
+from core.services import refresh_projects_in_background
+from core.stats import day_range
+from core.stats import get_stats_version
+from core.stats import pivot_daily_counts
+
+
+def get_new_projects_stats(new_projects):
+    """
+    Counts the given projects per source of SOURCES_CONFIG, and in total, with a single query.
+    """
+    per_source = {f"source_{i}": Count("id", filter=Q(source=source)) for i, source in enumerate(SOURCES_CONFIG)}
+    counts = new_projects.aggregate(total=Count("id"), **per_source)
+    return {source: counts[f"source_{i}"] for i, source in enumerate(SOURCES_CONFIG)}, counts["total"]
+
+
+HOME_PAGE_SIZE = 30
+DESCRIPTION_PREVIEW_LENGTH = 1000
 
 
 def home(request):
-    get_new_projects()
-    new_projects = Project.objects.filter(viewed__isnull=True).order_by(F("published_at").desc(nulls_last=True))
-    new_projects_stats = {
-        "emploitic.com": new_projects.filter(url__icontains="https://emploitic.com/").count(),
-        "nafezly.com": new_projects.filter(url__icontains="https://nafezly.com/").count(),
-        "ouedkniss.com": new_projects.filter(url__icontains="https://ouedkniss.com/").count(),
-        "baaeed.com": new_projects.filter(url__icontains="https://baaeed.com/").count(),
-        "bahr.sa": new_projects.filter(url__icontains="https://bahr.sa/").count(),
-        "mostaql.com": new_projects.filter(url__startswith="https://mostaql.com").count(),
-    }
+    new_projects = Project.objects.new()
+    # Cards only show the start of the description, the rest is loaded when one is expanded.
+    feed = new_projects.only("id", "title", "url", "source", "published_at").annotate(
+        description_preview=Left("description", DESCRIPTION_PREVIEW_LENGTH + 1),
+    )
+    paginator = KeysetPaginator(feed, ["published_at", "id"], per_page=HOME_PAGE_SIZE, nulls_last=True)
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursorError:
+        page = paginator.page()
+    for project in page.object_list:
+        project.description_truncated = len(project.description_preview) > DESCRIPTION_PREVIEW_LENGTH
+        project.description_preview = project.description_preview[:DESCRIPTION_PREVIEW_LENGTH]
+
+    if request.htmx:
+        return render(request, "core/home.html#project-list", {"page": page})
+
+    if settings.SCRAPERS_REFRESH_ON_VISIT:
+        refresh_projects_in_background()
+
+    new_projects_stats, new_projects_total = get_new_projects_stats(new_projects)
     return render(
         request,
         "core/home.html",
         {
-            "projects": new_projects,
+            "page": page,
             "new_projects_stats": new_projects_stats,
+            "new_projects_total": new_projects_total,
         },
     )
 
 
+def project_description(request, pk):
+    project = get_object_or_404(Project.objects.only("source", "description"), pk=pk)
+    return render(request, "core/home.html#project-description", {"project": project})
+
+
 class PeriodOption(TextChoices):
     LAST_7_DAYS = "7", "Last 7 days"
     LAST_30_DAYS = "30", "Last 30 days"
@@ -58,63 +96,51 @@ class StatsView(TemplateView):
         return ["core/stats.html"]
 
     def get_projects_by_source(self):
-        return Project.objects.annotate(
-            protocol_pos=StrIndex("url", Value("://")),
-            after_protocol=Substr("url", 3 + F("protocol_pos")),
-            slash_pos=StrIndex(F("after_protocol"), Value("/")),
-            source=Substr(F("after_protocol"), 1, F("slash_pos") - 1),
-        )
+        return DailySourceCount.objects.values("source").annotate(total=Sum("count")).order_by("source")
 
-    def get_daily_stats(self, day_list):
-        daily_stats = (
-            self.get_projects_by_source()
-            .filter(published_at__gte=day_list[0])
-            .annotate(day=TruncDate("published_at"))
-            .values("day", "source")
-            .annotate(count=Count("id"))
+    def get_daily_counts(self, day_list):
+        rows = DailySourceCount.objects.filter(day__range=(day_list[0], day_list[-1])).values_list(
+            "source",
+            "day",
+            "count",
         )
-        return self._format_daily_counts(daily_stats, day_list)
-
-    def _format_daily_counts(self, daily_stats, day_list):
-        source_daily_count = []
-        for source in self.SOURCES:
-            counts = [
-                next((item["count"] for item in daily_stats if item["source"] == source and item["day"] == day), 0)
-                for day in day_list
-            ]
-            source_daily_count.append({"name": source, "data": counts})
-        return source_daily_count
-
-    def _calculate_source_totals(self, daily_stats):
-        source_totals = {}
-        for source_count in daily_stats:
-            source = source_count["name"]
-            source_totals[source] = sum(source_count["data"])
-        return source_totals
+        return pivot_daily_counts(rows, self.SOURCES, day_list)
 
     def get_day_list(self):
         period = self.request.GET.get("period")
         period = period if period in PeriodOption.values else PeriodOption.LAST_7_DAYS.value
-        start_date = timezone.now().date() - timedelta(days=1)
-        day_list = [start_date - timedelta(days=i) for i in range(int(period))]
-        day_list.reverse()
-        return day_list
+        end_date = timezone.now().date() - timedelta(days=1)
+        return day_range(end_date - timedelta(days=int(period) - 1), end_date)
+
+    def get_stats(self, day_list):
+        projects_by_source = list(self.get_projects_by_source())
+        daily_counts = self.get_daily_counts(day_list)
+        source_totals = {source: sum(counts) for source, counts in zip(self.SOURCES, daily_counts, strict=True)}
+        return {
+            "source_daily_count": [
+                {"name": source, "data": counts} for source, counts in zip(self.SOURCES, daily_counts, strict=True)
+            ],
+            "source_totals": source_totals,
+            "daily_total": sum(source_totals.values()),
+            "projects_per_source": projects_by_source,
+            "project_count": sum(item["total"] for item in projects_by_source),
+        }
+
+    def get_source_states(self):
+        # Changes with every poll, so it's not part of the cached stats.
+        return SourceState.objects.filter(source__in=self.SOURCES).order_by("source")
+
+    def get_cached_stats(self, day_list):
+        key = f"stats:{get_stats_version()}:{day_list[0]}:{day_list[-1]}"
+        return cache.get_or_set(key, lambda: self.get_stats(day_list), timeout=settings.STATS_CACHE_TTL)
 
     def get(self, request, *args, **kwargs):
-        projects_by_source = (
-            self.get_projects_by_source().values("source").annotate(total=Count("id")).order_by("source")
-        )
         day_list = self.get_day_list()
-        source_daily_count = self.get_daily_stats(day_list)
-        source_total = self._calculate_source_totals(source_daily_count)
         context = {
-            "source_daily_count": source_daily_count,
-            "source_totals": source_total,
-            "daily_total": sum(source_total.values()),
+            **self.get_cached_stats(day_list),
+            "source_states": [] if self.request.htmx else self.get_source_states(),
             "source_colors": self.SOURCE_COLORS,
             "day_list": day_list,
-            "projects_per_source": list(projects_by_source),
-            "project_count": Project.objects.count(),
             "PeriodOption": PeriodOption,
             "selected_period_label": dict(PeriodOption.choices).get(
                 self.request.GET.get("period"),
@@ -128,15 +154,13 @@ stats_view = StatsView.as_view()
 
 
 def project_archive_view(request):
-    qs = Project.objects.filter(viewed__isnull=False)
-    template = "core/projects-archive.html"
-    paginator = Paginator(qs, 25)
-    page_number = request.GET.get("page") or 1
+    paginator = KeysetPaginator(Project.objects.archived(), ["viewed", "id"], per_page=25)
     try:
-        page = paginator.page(int(page_number))
-    except (ValueError, EmptyPage):
-        page = paginator.page(1)
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursorError:
+        page = paginator.page()
 
+    template = "core/projects-archive.html"
     if request.htmx:
         template = "core/projects-archive.html#project-list"
 
@@ -155,3 +179,37 @@ def mark_viewed(request, pk):
     project.viewed = timezone.now()
     project.save()
     return HttpResponse(status=204)
+
+
+MARK_VIEWED_MAX_IDS = 500
+
+
+@require_POST
+def mark_viewed_bulk(request):
+    """
+    Marks many projects as viewed with a single UPDATE.
+
+    Takes either the `ids` of the projects, or `until`, a datetime up to which all the
+    projects published are marked, in the current time zone unless it has an offset.
+    """
+    projects = Project.objects.filter(viewed__isnull=True)
+    if "until" in request.POST:
+        try:
+            published_until = parse_datetime(request.POST["until"])
+        except ValueError:
+            published_until = None
+        if published_until is None:
+            return HttpResponseBadRequest("Invalid until datetime")
+        if timezone.is_naive(published_until):
+            published_until = timezone.make_aware(published_until)
+        projects = projects.filter(published_at__lte=published_until)
+    else:
+        try:
+            ids = [int(pk) for pk in request.POST.getlist("ids")]
+        except ValueError:
+            return HttpResponseBadRequest("Invalid project ids")
+        if len(ids) > MARK_VIEWED_MAX_IDS:
+            return HttpResponseBadRequest(f"At most {MARK_VIEWED_MAX_IDS} ids can be marked at once")
+        projects = projects.filter(pk__in=ids)
+    projects.update(viewed=timezone.now())
+    return HttpResponse(status=204)
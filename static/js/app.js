@@ -1,9 +1,10 @@
-document.querySelectorAll(".expand-btn").forEach((expandButton) => {
-  // check if the text is clipped, otherwise remove the button and return
+const setupExpandButton = (expandButton) => {
+  // check if the text is clipped or truncated, otherwise remove the button and return
   const textClipElement = expandButton.previousElementSibling;
   if (
     textClipElement.scrollHeight <=
-    textClipElement.clientHeight
+    textClipElement.clientHeight &&
+    !textClipElement.dataset.descriptionUrl
   ) {
     expandButton.remove();
     return;
@@ -11,6 +12,12 @@ document.querySelectorAll(".expand-btn").forEach((expandButton) => {
 
   const expandButtonHandler = () => {
     if (!expandButton.dataset.expand) {
+      // cards only come with the start of long descriptions, load the rest on first expand
+      const descriptionUrl = textClipElement.dataset.descriptionUrl;
+      if (descriptionUrl) {
+        delete textClipElement.dataset.descriptionUrl;
+        htmx.ajax("GET", descriptionUrl, { target: textClipElement, swap: "innerHTML" });
+      }
       textClipElement.classList.remove("text-clip");
       expandButton.dataset.expand = "true";
       expandButton.textContent = "Show less";
@@ -36,6 +43,11 @@ document.querySelectorAll(".expand-btn").forEach((expandButton) => {
       }
     }, { once: true });
   });
+}
+
+// runs on the initial page and on the cards htmx loads while scrolling
+htmx.onLoad((content) => {
+  content.querySelectorAll(".expand-btn").forEach(setupExpandButton);
 });
 
 
@@ -43,3 +55,75 @@ function renderChart(element, config) {
     window.ApexCharts &&
         new ApexCharts(element, config).render();
 }
+
+
+// Projects are marked as viewed once scrolled into view. Their ids are collected and
+// sent together every few hundred milliseconds, instead of one request per project.
+const newProjects = document.getElementById("new-projects");
+
+if (newProjects) {
+  const MARK_VIEWED_DELAY = 300;
+  const pendingViewedIds = new Set();
+  let markViewedTimeout = null;
+
+  const postMarkViewed = (data) => {
+    const csrfToken = JSON.parse(document.body.getAttribute("hx-headers"))["X-CSRFToken"];
+    return fetch(newProjects.dataset.markViewedUrl, {
+      method: "POST",
+      headers: { "X-CSRFToken": csrfToken },
+      body: data,
+    });
+  }
+
+  const showViewed = (card) => {
+    card.querySelector(".viewed").classList.remove("d-none");
+  }
+
+  const flushViewed = () => {
+    markViewedTimeout = null;
+    const ids = [...pendingViewedIds];
+    pendingViewedIds.clear();
+    const data = new FormData();
+    ids.forEach((id) => data.append("ids", id));
+    postMarkViewed(data).then((response) => {
+      if (response.ok) {
+        ids.forEach((id) => showViewed(newProjects.querySelector(`.project-card[data-project-id="${id}"]`)));
+      }
+    });
+  }
+
+  const viewedObserver = new IntersectionObserver((entries, observer) => {
+    entries.filter((entry) => entry.isIntersecting).forEach((entry) => {
+      observer.unobserve(entry.target);
+      pendingViewedIds.add(entry.target.closest(".project-card").dataset.projectId);
+    });
+    if (pendingViewedIds.size && !markViewedTimeout) {
+      markViewedTimeout = setTimeout(flushViewed, MARK_VIEWED_DELAY);
+    }
+  }, { threshold: 1 });
+
+  htmx.onLoad((content) => {
+    content.querySelectorAll("[data-mark-viewed]").forEach((element) => viewedObserver.observe(element));
+  });
+
+  newProjects.addEventListener("click", (event) => {
+    const link = event.target.closest("[data-mark-viewed-until]");
+    if (!link) {
+      return;
+    }
+    event.preventDefault();
+    const until = link.dataset.markViewedUntil;
+    const data = new FormData();
+    data.append("until", until);
+    postMarkViewed(data).then((response) => {
+      if (!response.ok) {
+        return;
+      }
+      newProjects.querySelectorAll(".project-card[data-published-at]").forEach((card) => {
+        if (new Date(card.dataset.publishedAt) <= new Date(until)) {
+          showViewed(card);
+        }
+      });
+    });
+  });
+}